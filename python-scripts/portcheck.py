@@ -2,70 +2,442 @@
 """
 Port connectivity checker with advanced features.
 
-This script checks if a TCP/UDP port is open on a given host with support for
-timeouts, port ranges, concurrent scanning, and JSON output.
+This script checks if TCP/UDP ports are open on one or more hosts with support
+for timeouts, port lists, concurrent scanning, and JSON output.
 
 Usage:
     python3 portcheck.py <host> <port> [options]
     python3 portcheck.py example.com 80
     python3 portcheck.py 192.168.1.1 22 --timeout 5
     python3 portcheck.py example.com 80-443 --json
+    python3 portcheck.py 10.0.0.0/24 1-65535 --engine select
+    python3 portcheck.py web1,web2 443 --watch 60
 """
 
 import sys
 import socket
 import argparse
+import asyncio
+import errno
+import heapq
+import ipaddress
+import itertools
 import json
+import math
+import multiprocessing
+import os
+import selectors
+import signal
+import threading
 import time
-from typing import Dict, List, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from array import array
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set,
+                    Tuple)
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from multiprocessing.connection import wait as wait_connections
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
-def check_port(host: str, port: int, timeout: int = 5, protocol: str = 'tcp') -> Dict[str, any]:
+ENGINES = ('thread', 'async', 'select')
+DEFAULT_WORKERS = {'thread': 10, 'async': 1000, 'select': 5000}
+
+# connect_ex() results meaning a non-blocking connect is still in progress
+CONNECT_PENDING = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+# connect_ex() results on a socket with a timeout that ran out
+CONNECT_TIMED_OUT = (errno.EAGAIN, errno.EWOULDBLOCK, errno.ETIMEDOUT)
+
+# Hosts interleaved per scheduling block in iter_probes()
+HOST_BLOCK_SIZE = 256
+
+# File descriptors kept free for stdio, logging and the event loop itself
+FD_RESERVE = 64
+
+# Seconds a resolved (or failed) hostname stays cached
+DNS_TTL = 300.0
+
+# Threads used to resolve a block of hostnames ahead of scanning it
+DNS_PREFETCH_WORKERS = 32
+
+# Adaptive timeouts: initial RTO before any sample, floor, and RFC 6298 gains
+INITIAL_RTO = 1.0
+MIN_TIMEOUT = 0.1
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+RTT_K = 4
+
+# AIMD concurrency control: starting window and multiplicative decrease factor
+AIMD_INITIAL = 16
+AIMD_DECREASE = 0.5
+
+# Local errors that mean we are sending faster than the host can cope with
+CONGESTION_ERRNOS = (errno.EAGAIN, errno.ENOBUFS)
+
+# Seconds between progress reports during a scan
+PROGRESS_INTERVAL = 1.0
+
+# Seconds between flushes of buffered checkpoint records to the state file
+CHECKPOINT_INTERVAL = 1.0
+
+# Results per message, and max seconds a partial batch waits, from shard workers
+SHARD_BATCH_SIZE = 512
+SHARD_FLUSH_INTERVAL = 0.2
+
+# Upper bounds (ms) of the latency histogram buckets used in watch mode
+LATENCY_BUCKETS_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                      1000, 2000, 5000, float('inf'))
+
+# Error reported for UDP probes that got neither a reply nor an ICMP error
+UDP_NO_RESPONSE = 'No response (open or filtered)'
+
+# Most frequently open ports, most common first (from nmap-services)
+TOP_PORTS = {
+    'tcp': (80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080,
+            1723, 111, 995, 993, 5900, 1025, 587, 8888, 199, 1720, 465, 548, 113, 81,
+            6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554, 26, 1433,
+            49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153,
+            8081, 2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357,
+            427, 49156, 543, 544, 5101, 144, 7, 389, 8009, 3128, 444, 9999, 5009,
+            7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157, 1028,
+            873, 1755, 2717, 4899, 9100, 119, 37),
+    'udp': (631, 161, 137, 123, 138, 1434, 445, 135, 67, 53, 139, 500, 68, 520, 1900,
+            4500, 514, 49152, 162, 69, 5353, 111, 49154, 1701, 998, 996, 997, 999,
+            3283, 49153),
+}
+
+# Largest UDP reply read from a probed port
+UDP_RECV_SIZE = 4096
+
+# Requests that make common UDP services answer; other ports get an empty datagram
+DNS_QUERY = (b'\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00'   # header, RD, 1 question
+             b'\x00\x00\x02\x00\x01')                                   # ". IN NS"
+UDP_PAYLOADS = {
+    53: DNS_QUERY,
+    # NBSTAT query for the wildcard name '*'
+    137: (b'\x80\xf0\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00'
+          b'\x20CKAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\x00\x00\x21\x00\x01'),
+    # NTPv3 client request (LI=0, VN=3, Mode=3)
+    123: b'\x1b' + b'\x00' * 47,
+    # SNMPv1 GetRequest for sysDescr.0 with community 'public'
+    161: (b'\x30\x29\x02\x01\x00\x04\x06public'
+          b'\xa0\x1c\x02\x04\x12\x34\x56\x78\x02\x01\x00\x02\x01\x00'
+          b'\x30\x0e\x30\x0c\x06\x08\x2b\x06\x01\x02\x01\x01\x01\x00\x05\x00'),
+    1900: (b'M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n'
+           b'MAN: "ssdp:discover"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n'),
+    5353: DNS_QUERY,
+}
+
+
+class ScanStopped(Exception):
+    """Raised from an on_result callback to end a scan early."""
+
+
+class ResolverCache:
+    """Thread-safe getaddrinfo() cache that resolves each hostname once per TTL."""
+
+    def __init__(self, ttl: float = DNS_TTL, family: int = socket.AF_UNSPEC):
+        self.ttl = ttl
+        self.family = family
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, host: str) -> Optional[List[str]]:
+        """
+        Return cached addresses for host without blocking on DNS.
+
+        Returns:
+            List of address strings, or None if the host is not cached
+
+        Raises:
+            socket.gaierror: If the cached lookup failed
+        """
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        if isinstance(entry[1], socket.gaierror):
+            raise entry[1]
+        return entry[1]
+
+    def resolve(self, host: str) -> List[str]:
+        """
+        Return all addresses for host, resolving it at most once per TTL.
+
+        Concurrent callers asking for the same host wait for a single lookup.
+        Failed lookups are cached for the same TTL.
+
+        Raises:
+            socket.gaierror: If the host cannot be resolved
+        """
+        addresses = self.lookup(host)
+        if addresses is not None:
+            return addresses
+
+        with self._lock:
+            host_lock = self._host_locks.setdefault(host, threading.Lock())
+
+        with host_lock:
+            addresses = self.lookup(host)
+            if addresses is not None:
+                return addresses
+
+            try:
+                infos = socket.getaddrinfo(host, None, self.family, socket.SOCK_STREAM,
+                                           0, socket.AI_ADDRCONFIG)
+                value = list(dict.fromkeys(info[4][0] for info in infos))
+            except socket.gaierror as e:
+                value = e
+
+            with self._lock:
+                self._entries[host] = (time.monotonic() + self.ttl, value)
+
+        if isinstance(value, socket.gaierror):
+            raise value
+        return value
+
+    def prefetch(self, hosts: List[str]) -> None:
+        """Resolve several hosts concurrently so later resolve() calls hit the cache."""
+        def quiet_resolve(host: str) -> None:
+            try:
+                self.resolve(host)
+            except socket.gaierror:
+                pass
+
+        misses = [host for host in hosts if host not in self._entries]
+        if len(misses) > 1:
+            with ThreadPoolExecutor(max_workers=min(DNS_PREFETCH_WORKERS, len(misses))) as pool:
+                list(pool.map(quiet_resolve, misses))
+
+
+DEFAULT_RESOLVER = ResolverCache()
+
+
+class ProbeTimeouts:
+    """
+    Per-host connect timeouts, either fixed or adapted from observed RTTs.
+
+    In adaptive mode each host keeps a smoothed RTT and RTT variance updated
+    from the latency of probes that completed (open or refused), and its
+    timeout is SRTT + 4 * RTTVAR clamped to [min_timeout, timeout]. Probes
+    that time out may be retried once with the timeout doubled. Engines only
+    call this from a single thread, so no locking is done.
+    """
+
+    def __init__(self, timeout: float, adaptive: bool = False,
+                 min_timeout: float = MIN_TIMEOUT):
+        self.timeout = timeout
+        self.adaptive = adaptive
+        self.min_timeout = min(min_timeout, timeout)
+        self.retries = 1 if adaptive else 0
+        self._rtt: Dict[str, List[float]] = {}   # host -> [srtt, rttvar]
+
+    def get(self, host: str, attempt: int = 0) -> float:
+        """Return the timeout in seconds for the given host and attempt number."""
+        if not self.adaptive:
+            return self.timeout
+
+        estimate = self._rtt.get(host)
+        if estimate is None:
+            rto = INITIAL_RTO
+        else:
+            rto = estimate[0] + RTT_K * estimate[1]
+        rto *= 2 ** attempt
+
+        return min(self.timeout, max(self.min_timeout, rto))
+
+    def observe(self, result: Dict) -> None:
+        """Update the host's RTT estimate from a completed result."""
+        if not self.adaptive or result['error'] or result['latency_ms'] is None:
+            return
+
+        rtt = result['latency_ms'] / 1000
+        estimate = self._rtt.get(result['host'])
+        if estimate is None:
+            self._rtt[result['host']] = [rtt, rtt / 2]
+        else:
+            estimate[1] = (1 - RTT_BETA) * estimate[1] + RTT_BETA * abs(estimate[0] - rtt)
+            estimate[0] = (1 - RTT_ALPHA) * estimate[0] + RTT_ALPHA * rtt
+
+    def should_retry(self, result: Dict, attempt: int) -> bool:
+        """Return True if a timed-out probe deserves another attempt."""
+        return (attempt < self.retries
+                and result['error'] in ('Connection timeout', UDP_NO_RESPONSE))
+
+
+class ScanThrottle:
+    """
+    Pace probe launches with a token bucket and an AIMD concurrency window.
+
+    The token bucket caps connection attempts per second (with a burst of up
+    to one second's worth). The concurrency window, when enabled, starts at
+    AIMD_INITIAL, doubles per window of successes until the first congestion
+    signal (slow start), then grows by one per window and is halved on
+    timeouts or EAGAIN/ENOBUFS, at most once per window. Engines only call
+    this from a single thread, so no locking is done.
+    """
+
+    def __init__(self, max_concurrency: int, rate: Optional[float] = None,
+                 aimd: bool = False):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.aimd = aimd
+        self._window = float(min(max_concurrency, AIMD_INITIAL)) if aimd else max_concurrency
+        self._threshold = float(max_concurrency)
+        self._since_decrease = 0
+        self._burst = max(1.0, rate) if rate else 0.0
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+
+    @property
+    def concurrency(self) -> int:
+        """Number of probes currently allowed in flight."""
+        return max(1, min(self.max_concurrency, int(self._window)))
+
+    def delay(self) -> float:
+        """
+        Take a token for one probe launch if the rate allows it.
+
+        Returns:
+            0.0 if the probe may be launched now, otherwise the number of
+            seconds until a token is available (no token is taken)
+        """
+        if not self.rate:
+            return 0.0
+
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def observe(self, result: Dict) -> None:
+        """Adjust the concurrency window from a completed result."""
+        if not self.aimd:
+            return
+
+        self._since_decrease += 1
+        if is_congestion(result):
+            if self._since_decrease >= self.concurrency:
+                self._threshold = max(1.0, self._window * AIMD_DECREASE)
+                self._window = self._threshold
+                self._since_decrease = 0
+        elif self._window < self._threshold:
+            self._window += 1
+        else:
+            self._window += 1 / self._window
+        self._window = min(self._window, float(self.max_concurrency))
+
+
+def is_congestion(result: Dict) -> bool:
+    """Return True if a result suggests probes are being dropped or throttled."""
+    error = result['error']
+    if not error:
+        return False
+    if error == 'Connection timeout':
+        return True
+    return any(os.strerror(code) in error for code in CONGESTION_ERRNOS)
+
+
+def udp_payload(port: int) -> bytes:
+    """Return the datagram most likely to get an answer from a UDP port."""
+    return UDP_PAYLOADS.get(port, b'')
+
+
+def address_family(address: str) -> int:
+    """Return the socket address family for a numeric IP address."""
+    return socket.AF_INET6 if ':' in address else socket.AF_INET
+
+
+def new_result(host: str, port: int, protocol: str) -> Dict[str, any]:
+    """Create an empty result dictionary for a single port check."""
+    return {
+        'host': host,
+        'address': None,
+        'port': port,
+        'protocol': protocol,
+        'open': False,
+        'error': None,
+        'latency_ms': None
+    }
+
+
+def check_port(host: str, port: int, timeout: float = 5, protocol: str = 'tcp',
+               address: Optional[str] = None,
+               active: Optional[Set[socket.socket]] = None) -> Dict[str, any]:
     """
     Check if a port is open on a host.
 
+    UDP probes use a connected socket, so an ICMP port-unreachable surfaces
+    as ECONNREFUSED and closed ports are told apart within one round trip.
+    Well-known services are sent a request they answer (see UDP_PAYLOADS).
+
     Args:
         host: Hostname or IP address
         port: Port number to check
         timeout: Connection timeout in seconds
         protocol: Protocol to use ('tcp' or 'udp')
+        address: Pre-resolved IP address to connect to (or the socket.gaierror
+                 of a failed lookup); resolved through DEFAULT_RESOLVER if None
+        active: Set the probe's socket is kept in while it is in use, so that
+                another thread can shut it down to abort the probe
 
     Returns:
         Dictionary with check results including host, port, open status, error, and latency
     """
-    result = {
-        'host': host,
-        'port': port,
-        'protocol': protocol,
-        'open': False,
-        'error': None,
-        'latency_ms': None
-    }
+    result = new_result(host, port, protocol)
 
     try:
+        if address is None:
+            address = DEFAULT_RESOLVER.resolve(host)[0]
+        elif isinstance(address, socket.gaierror):
+            raise address
+        result['address'] = address
+        family = address_family(address)
+
         start_time = time.time()
 
         if protocol.lower() == 'tcp':
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock = socket.socket(family, socket.SOCK_STREAM)
             sock.settimeout(timeout)
-            result_code = sock.connect_ex((host, port))
-            sock.close()
+            if active is not None:
+                active.add(sock)
+            try:
+                result_code = sock.connect_ex((address, port))
+            finally:
+                if active is not None:
+                    active.discard(sock)
+                sock.close()
             result['open'] = (result_code == 0)
+            if result_code in CONNECT_TIMED_OUT:
+                result['error'] = 'Connection timeout'
 
         elif protocol.lower() == 'udp':
-            # UDP is connectionless, so we send a packet and wait for response
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # A connected UDP socket reports ICMP port-unreachable as ECONNREFUSED
+            sock = socket.socket(family, socket.SOCK_DGRAM)
             sock.settimeout(timeout)
+            if active is not None:
+                active.add(sock)
             try:
-                sock.sendto(b'', (host, port))
-                sock.recvfrom(1024)
+                sock.connect((address, port))
+                sock.send(udp_payload(port))
+                sock.recv(UDP_RECV_SIZE)
                 result['open'] = True
+            except ConnectionRefusedError:
+                result['open'] = False
             except socket.timeout:
                 # No response doesn't necessarily mean closed for UDP
                 result['open'] = None  # Unknown
-                result['error'] = 'No response (UDP is unreliable for port checking)'
+                result['error'] = UDP_NO_RESPONSE
             finally:
+                if active is not None:
+                    active.discard(sock)
                 sock.close()
 
         result['latency_ms'] = round((time.time() - start_time) * 1000, 2)
@@ -84,9 +456,809 @@ def check_port(host: str, port: int, timeout: int = 5, protocol: str = 'tcp') ->
     return result
 
 
+async def check_port_async(host: str, port: int, timeout: float = 5,
+                           protocol: str = 'tcp',
+                           address: Optional[str] = None) -> Dict[str, any]:
+    """
+    Check if a port is open on a host without blocking the event loop.
+
+    TCP checks use a non-blocking socket and loop.sock_connect(). UDP checks
+    are delegated to check_port() in the loop's default executor.
+
+    Args:
+        host: Hostname or IP address
+        port: Port number to check
+        timeout: Connection timeout in seconds
+        protocol: Protocol to use ('tcp' or 'udp')
+        address: Pre-resolved IP address, as for check_port()
+
+    Returns:
+        Dictionary with the same keys as check_port()
+    """
+    loop = asyncio.get_running_loop()
+
+    if protocol.lower() != 'tcp':
+        return await loop.run_in_executor(None, check_port, host, port, timeout,
+                                          protocol, address)
+
+    result = new_result(host, port, protocol)
+    sock = None
+
+    try:
+        if address is None:
+            addresses = DEFAULT_RESOLVER.lookup(host)
+            if addresses is None:
+                addresses = await loop.run_in_executor(None, DEFAULT_RESOLVER.resolve, host)
+            address = addresses[0]
+        elif isinstance(address, socket.gaierror):
+            raise address
+        result['address'] = address
+
+        start_time = time.time()
+        sock = socket.socket(address_family(address), socket.SOCK_STREAM)
+        sock.setblocking(False)
+
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+            result['open'] = True
+        except ConnectionRefusedError:
+            result['open'] = False
+        except asyncio.TimeoutError:
+            result['error'] = 'Connection timeout'
+
+        result['latency_ms'] = round((time.time() - start_time) * 1000, 2)
+
+    except socket.gaierror as e:
+        result['error'] = f'DNS resolution failed: {e}'
+    except PermissionError:
+        result['error'] = 'Permission denied (may need root for some operations)'
+    except OSError as e:
+        result['error'] = f'OS error: {e}'
+    except Exception as e:
+        result['error'] = f'Unexpected error: {e}'
+    finally:
+        if sock is not None:
+            sock.close()
+
+    return result
+
+
+def raise_fd_limit(wanted: int) -> int:
+    """
+    Raise the soft open-file limit so that `wanted` sockets can be open at once.
+
+    Args:
+        wanted: Number of concurrent sockets required
+
+    Returns:
+        Number of concurrent sockets that the (possibly raised) limit allows
+    """
+    if resource is None:
+        return wanted
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = wanted + FD_RESERVE
+
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        new_soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except (ValueError, OSError):
+            pass
+
+    if soft == resource.RLIM_INFINITY:
+        return wanted
+    return max(1, min(wanted, soft - FD_RESERVE))
+
+
+async def _scan_async(probes: Iterable[Tuple[str, int, Any]], timeouts: ProbeTimeouts,
+                      protocol: str, throttle: ScanThrottle,
+                      emit: Callable[[Dict], None]) -> None:
+    """
+    Run check_port_async() for every probe within the throttle's limits.
+
+    A single event loop keeps up to the throttle's concurrency of
+    non-blocking connects in flight behind a bounded semaphore.
+    """
+    semaphore = asyncio.BoundedSemaphore(throttle.max_concurrency)
+    slot_freed = asyncio.Event()
+    pending = set()
+    failed = []
+
+    async def launch_slot() -> None:
+        """Wait for the AIMD window and a rate token, then take a semaphore slot."""
+        while len(pending) >= throttle.concurrency:
+            slot_freed.clear()
+            await slot_freed.wait()
+        delay = throttle.delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = throttle.delay()
+        await semaphore.acquire()
+
+    async def probe(host: str, port: int, address: Any) -> None:
+        try:
+            attempt = 0
+            while True:
+                result = await check_port_async(host, port, timeouts.get(host, attempt),
+                                                protocol, address)
+                timeouts.observe(result)
+                if not timeouts.should_retry(result, attempt):
+                    break
+                attempt += 1
+                delay = throttle.delay()
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = throttle.delay()
+        except Exception as e:
+            result = new_result(host, port, protocol)
+            result['error'] = f'Check failed: {e}'
+        finally:
+            semaphore.release()
+        emit(result)
+
+    def release_slot(task: asyncio.Task) -> None:
+        pending.discard(task)
+        if not task.cancelled() and task.exception():
+            failed.append(task.exception())
+        slot_freed.set()
+
+    try:
+        # Acquire before creating each task so only the allowed number of tasks exist
+        for host, port, address in probes:
+            await launch_slot()
+            if failed:
+                semaphore.release()
+                raise failed[0]
+            task = asyncio.ensure_future(probe(host, port, address))
+            pending.add(task)
+            task.add_done_callback(release_slot)
+
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        # Stop probes still in flight when the scan ends early (e.g. ScanStopped)
+        for task in list(pending):
+            task.cancel()
+
+
+def _scan_selectors(probes: Iterable[Tuple[str, int, Any]], timeouts: ProbeTimeouts,
+                    throttle: ScanThrottle, emit: Callable[[Dict], None]) -> None:
+    """
+    Check TCP probes with non-blocking sockets multiplexed on one selector.
+
+    Connects are kept in flight up to the throttle's concurrency and started
+    no faster than its rate allows. Completion is detected by
+    write-readiness and read back with SO_ERROR; probes that outlive their
+    deadline are expired from a min-heap without a per-socket timer.
+    """
+    selector = selectors.DefaultSelector()
+    deadlines = []   # heap of (deadline, sequence, sock)
+    inflight = {}    # sock -> (result, start_time, probe, attempt)
+    probe_iter = iter(probes)
+    deferred = []    # (probe, attempt) waiting for a socket (EMFILE) or a retry
+    sequence = 0
+    exhausted = False
+
+    def finish(sock: socket.socket, err: int, now: float) -> None:
+        result, start_time, probe, attempt = inflight.pop(sock)
+        try:
+            selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+        if err == 0:
+            result['open'] = True
+        elif err == errno.ETIMEDOUT:
+            result['error'] = 'Connection timeout'
+        elif err != errno.ECONNREFUSED:
+            result['error'] = f'OS error: {os.strerror(err)}'
+        result['latency_ms'] = round((now - start_time) * 1000, 2)
+
+        timeouts.observe(result)
+        if timeouts.should_retry(result, attempt):
+            deferred.append((probe, attempt + 1))
+        else:
+            emit(result)
+
+    try:
+        while True:
+            # Open a batch of connects up to the concurrency limit
+            rate_wait = None
+            while (deferred or not exhausted) and len(inflight) < throttle.concurrency:
+                rate_wait = throttle.delay() or None
+                if rate_wait:
+                    break
+
+                if deferred:
+                    probe, attempt = deferred.pop()
+                else:
+                    probe = next(probe_iter, None)
+                    if probe is None:
+                        exhausted = True
+                        break
+                    attempt = 0
+                host, port, address = probe
+
+                result = new_result(host, port, 'tcp')
+                try:
+                    if address is None:
+                        address = DEFAULT_RESOLVER.resolve(host)[0]
+                    elif isinstance(address, socket.gaierror):
+                        raise address
+                except socket.gaierror as e:
+                    result['error'] = f'DNS resolution failed: {e}'
+                    emit(result)
+                    continue
+                result['address'] = address
+
+                try:
+                    sock = socket.socket(address_family(address), socket.SOCK_STREAM)
+                except OSError as e:
+                    if e.errno in (errno.EMFILE, errno.ENFILE) and inflight:
+                        deferred.append((probe, attempt))
+                        break
+                    result['error'] = f'OS error: {e}'
+                    emit(result)
+                    continue
+
+                sock.setblocking(False)
+                start_time = time.monotonic()
+                inflight[sock] = (result, start_time, probe, attempt)
+                err = sock.connect_ex((address, port))
+
+                if err in CONNECT_PENDING:
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    sequence += 1
+                    deadline = start_time + timeouts.get(host, attempt)
+                    heapq.heappush(deadlines, (deadline, sequence, sock))
+                else:
+                    finish(sock, err, time.monotonic())
+
+            if not inflight:
+                if exhausted and not deferred:
+                    break
+                if rate_wait:
+                    time.sleep(rate_wait)
+                continue
+
+            # Drop heap entries for sockets that already completed
+            while deadlines and deadlines[0][2] not in inflight:
+                heapq.heappop(deadlines)
+
+            wait = max(0.0, deadlines[0][0] - time.monotonic()) if deadlines else None
+            if rate_wait is not None:
+                wait = rate_wait if wait is None else min(wait, rate_wait)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                finish(sock, sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR),
+                       time.monotonic())
+
+            now = time.monotonic()
+            while deadlines and deadlines[0][0] <= now:
+                _, _, sock = heapq.heappop(deadlines)
+                if sock in inflight:
+                    finish(sock, errno.ETIMEDOUT, now)
+    finally:
+        for sock in list(inflight):
+            sock.close()
+        selector.close()
+
+
+def _scan_udp(probes: Iterable[Tuple[str, int, Any]], timeouts: ProbeTimeouts,
+              throttle: ScanThrottle, emit: Callable[[Dict], None]) -> None:
+    """
+    Check UDP probes over a pool of connected datagram sockets on one selector.
+
+    Each in-flight probe owns a socket connected to its target and sends the
+    port's payload. A reply marks the port open, ECONNREFUSED (ICMP port
+    unreachable) marks it closed, and silence past the deadline leaves it
+    unknown. Sockets that got an answer are reconnected for later probes;
+    sockets that timed out are closed so a late ICMP error cannot be
+    attributed to the wrong port.
+    """
+    selector = selectors.DefaultSelector()
+    deadlines = []   # heap of (deadline, sequence, sock)
+    inflight = {}    # sock -> (result, start_time, probe, attempt, sequence)
+    idle = {socket.AF_INET: [], socket.AF_INET6: []}
+    probe_iter = iter(probes)
+    deferred = []    # (probe, attempt) waiting for a socket (EMFILE) or a retry
+    sequence = 0
+    exhausted = False
+
+    def is_live(entry: Tuple[float, int, socket.socket]) -> bool:
+        # Reused sockets leave stale heap entries behind; match on the sequence
+        _, entry_sequence, sock = entry
+        return sock in inflight and inflight[sock][4] == entry_sequence
+
+    def finish(sock: socket.socket, now: float, is_open: Optional[bool],
+               error: Optional[str] = None) -> None:
+        result, start_time, probe, attempt, _ = inflight.pop(sock)
+        selector.unregister(sock)
+        if error is None and is_open is not None:
+            idle[sock.family].append(sock)
+        else:
+            sock.close()
+
+        result['open'] = is_open
+        result['error'] = error
+        result['latency_ms'] = round((now - start_time) * 1000, 2)
+
+        timeouts.observe(result)
+        if timeouts.should_retry(result, attempt):
+            deferred.append((probe, attempt + 1))
+        else:
+            emit(result)
+
+    try:
+        while True:
+            # Send a batch of probes up to the concurrency limit
+            rate_wait = None
+            while (deferred or not exhausted) and len(inflight) < throttle.concurrency:
+                rate_wait = throttle.delay() or None
+                if rate_wait:
+                    break
+
+                if deferred:
+                    probe, attempt = deferred.pop()
+                else:
+                    probe = next(probe_iter, None)
+                    if probe is None:
+                        exhausted = True
+                        break
+                    attempt = 0
+                host, port, address = probe
+
+                result = new_result(host, port, 'udp')
+                try:
+                    if address is None:
+                        address = DEFAULT_RESOLVER.resolve(host)[0]
+                    elif isinstance(address, socket.gaierror):
+                        raise address
+                except socket.gaierror as e:
+                    result['error'] = f'DNS resolution failed: {e}'
+                    emit(result)
+                    continue
+                result['address'] = address
+
+                family = address_family(address)
+                try:
+                    if idle[family]:
+                        sock = idle[family].pop()
+                    else:
+                        sock = socket.socket(family, socket.SOCK_DGRAM)
+                        sock.setblocking(False)
+                except OSError as e:
+                    if e.errno in (errno.EMFILE, errno.ENFILE) and inflight:
+                        deferred.append((probe, attempt))
+                        break
+                    result['error'] = f'OS error: {e}'
+                    emit(result)
+                    continue
+
+                start_time = time.monotonic()
+                try:
+                    sock.connect((address, port))
+                    sock.send(udp_payload(port))
+                except OSError as e:
+                    sock.close()
+                    result['error'] = f'OS error: {e}'
+                    result['latency_ms'] = round((time.monotonic() - start_time) * 1000, 2)
+                    emit(result)
+                    continue
+
+                sequence += 1
+                inflight[sock] = (result, start_time, probe, attempt, sequence)
+                selector.register(sock, selectors.EVENT_READ)
+                deadline = start_time + timeouts.get(host, attempt)
+                heapq.heappush(deadlines, (deadline, sequence, sock))
+
+            if not inflight:
+                if exhausted and not deferred:
+                    break
+                if rate_wait:
+                    time.sleep(rate_wait)
+                continue
+
+            # Drop heap entries for sockets that already completed
+            while deadlines and not is_live(deadlines[0]):
+                heapq.heappop(deadlines)
+
+            wait = max(0.0, deadlines[0][0] - time.monotonic()) if deadlines else None
+            if rate_wait is not None:
+                wait = rate_wait if wait is None else min(wait, rate_wait)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                try:
+                    sock.recv(UDP_RECV_SIZE)
+                except BlockingIOError:
+                    continue
+                except ConnectionRefusedError:
+                    finish(sock, time.monotonic(), False)
+                except OSError as e:
+                    finish(sock, time.monotonic(), False, f'OS error: {e}')
+                else:
+                    finish(sock, time.monotonic(), True)
+
+            now = time.monotonic()
+            while deadlines and deadlines[0][0] <= now:
+                entry = heapq.heappop(deadlines)
+                if is_live(entry):
+                    finish(entry[2], now, None, UDP_NO_RESPONSE)
+    finally:
+        for sock in list(inflight):
+            sock.close()
+        for sockets in idle.values():
+            for sock in sockets:
+                sock.close()
+        selector.close()
+
+
+def _scan_threads(probes: Iterable[Tuple[str, int, Any]], timeouts: ProbeTimeouts,
+                  protocol: str, throttle: ScanThrottle,
+                  emit: Callable[[Dict], None]) -> None:
+    """
+    Run check_port() for every probe on a thread pool, submitting lazily.
+
+    If the scan ends early (ScanStopped, Ctrl-C), the sockets of probes still
+    connecting are shut down so their threads return at once instead of
+    holding up interpreter exit until their timeouts expire.
+    """
+    futures = {}
+    active: Set[socket.socket] = set()
+    workers = throttle.max_concurrency
+
+    def capacity() -> int:
+        # Without AIMD keep a small backlog per worker so the pool never idles
+        return throttle.concurrency if throttle.aimd else workers * 4
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(probe: Tuple[str, int, Any], attempt: int) -> None:
+        delay = throttle.delay()
+        while delay > 0:
+            time.sleep(delay)
+            delay = throttle.delay()
+        host, port, address = probe
+        future = executor.submit(check_port, host, port, timeouts.get(host, attempt),
+                                 protocol, address, active)
+        futures[future] = (probe, attempt)
+
+    def collect() -> None:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            probe, attempt = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = new_result(probe[0], probe[1], protocol)
+                result['error'] = f'Check failed: {e}'
+            timeouts.observe(result)
+            if timeouts.should_retry(result, attempt):
+                submit(probe, attempt + 1)
+            else:
+                emit(result)
+
+    try:
+        for probe in probes:
+            while len(futures) >= capacity():
+                collect()
+            submit(probe, 0)
+
+        while futures:
+            collect()
+    finally:
+        # Drop queued probes if the scan ends early and abort the blocking
+        # connects already running; shutdown() wakes a thread blocked on its socket
+        executor.shutdown(wait=False, cancel_futures=True)
+        if futures:
+            for sock in list(active):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def result_sort_key(result: Dict) -> Tuple:
+    """Sort key ordering results by address (numerically for IPs), then port."""
+    try:
+        address = ipaddress.ip_address(result['host'])
+        return (0, address.version, int(address), '', result['port'])
+    except ValueError:
+        return (1, 0, 0, result['host'], result['port'])
+
+
+class ResultStore:
+    """
+    Column-oriented storage for collected scan results.
+
+    Each result is kept as one entry in a set of typed arrays (string ids for
+    host, address, protocol and error, plus port, state and latency), about
+    23 bytes instead of a dict of several hundred. Strings are interned in a
+    shared table. Dicts are only rebuilt when the store is iterated.
+    """
+
+    STATES = {True: 1, False: 0, None: -1}
+
+    def __init__(self, open_only: bool = False):
+        self.open_only = open_only
+        self._strings: List[Optional[str]] = [None]
+        self._string_ids: Dict[Optional[str], int] = {None: 0}
+        self._host = array('I')
+        self._address = array('I')
+        self._protocol = array('I')
+        self._error = array('I')
+        self._port = array('H')
+        self._state = array('b')
+        self._latency = array('f')
+
+    def _intern(self, value: Optional[str]) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def add(self, result: Dict) -> None:
+        """Store a result (closed and filtered ones are dropped if open_only)."""
+        if self.open_only and result_state(result) in ('closed', 'filtered'):
+            return
+        self._host.append(self._intern(result['host']))
+        self._address.append(self._intern(result.get('address')))
+        self._protocol.append(self._intern(result['protocol']))
+        self._error.append(self._intern(result['error']))
+        self._port.append(result['port'])
+        self._state.append(self.STATES[result['open']])
+        latency = result['latency_ms']
+        self._latency.append(math.nan if latency is None else latency)
+
+    def __len__(self) -> int:
+        return len(self._port)
+
+    def _result(self, i: int) -> Dict[str, any]:
+        strings = self._strings
+        state = self._state[i]
+        latency = self._latency[i]
+        return {
+            'host': strings[self._host[i]],
+            'address': strings[self._address[i]],
+            'port': self._port[i],
+            'protocol': strings[self._protocol[i]],
+            'open': None if state < 0 else bool(state),
+            'error': strings[self._error[i]],
+            'latency_ms': None if math.isnan(latency) else round(latency, 2),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Yield results as dicts in arrival order."""
+        return (self._result(i) for i in range(len(self)))
+
+    def iter_sorted(self) -> Iterator[Dict]:
+        """Yield results as dicts ordered like result_sort_key()."""
+        by_host: Dict[int, array] = {}
+        for i, host_id in enumerate(self._host):
+            by_host.setdefault(host_id, array('I')).append(i)
+
+        def host_key(host_id: int) -> Tuple:
+            return result_sort_key({'host': self._strings[host_id], 'port': 0})
+
+        for host_id in sorted(by_host, key=host_key):
+            indices = by_host.pop(host_id)
+            for i in sorted(indices, key=self._port.__getitem__):
+                yield self._result(i)
+
+
+class ReorderBuffer:
+    """
+    Re-sequence streamed results into port order within a bounded window.
+
+    Results are held in a min-heap of at most `size` entries; once it is full,
+    every new result releases the lowest-ordered one. Output is exactly in
+    order as long as no result arrives more than `size` places late.
+    """
+
+    def __init__(self, emit: Callable[[Dict], None], size: int):
+        self.emit = emit
+        self.size = size
+        self._heap = []
+        self._sequence = 0
+
+    def push(self, result: Dict) -> None:
+        """Buffer a result, releasing the lowest-ordered one if the window is full."""
+        self._sequence += 1
+        heapq.heappush(self._heap, (result['port'], result_sort_key(result),
+                                    self._sequence, result))
+        if len(self._heap) > self.size:
+            self.emit(heapq.heappop(self._heap)[-1])
+
+    def flush(self) -> None:
+        """Release every buffered result in order."""
+        while self._heap:
+            self.emit(heapq.heappop(self._heap)[-1])
+
+
+def probe_key(host: str, port: int, protocol: str, address: Any = None,
+              all_addresses: bool = False) -> Tuple:
+    """Identify a probe; the address only matters when probing every address."""
+    if all_addresses and isinstance(address, str):
+        return (host, address, port, protocol)
+    return (host, None, port, protocol)
+
+
+def skip_done(probes: Iterable[Tuple[str, int, Any]], done: set, protocol: str,
+              all_addresses: bool = False) -> Iterator[Tuple[str, int, Any]]:
+    """Filter out probes whose probe_key() is in `done`."""
+    for probe in probes:
+        host, port, address = probe
+        if probe_key(host, port, protocol, address, all_addresses) not in done:
+            yield probe
+
+
+class ScanCheckpoint:
+    """
+    Append-only state file of completed results for resuming a scan.
+
+    Each completed result is written as one line of compact JSON. Writes are
+    buffered and flushed about once per CHECKPOINT_INTERVAL, so checkpointing
+    costs one write() per second rather than one per probe; at most the last
+    interval of results is lost on a crash. A torn final line is ignored.
+    """
+
+    def __init__(self, path: str, resume: bool = False, all_addresses: bool = False):
+        self.path = path
+        self.all_addresses = all_addresses
+        self.done = set()
+        self._resumed = resume
+        self._buffer = []
+        self._flushed = time.monotonic()
+
+        if resume:
+            for result in self._read():
+                self.done.add(self.key(result['host'], result['port'],
+                                       result['protocol'], result.get('address')))
+        self._file = open(path, 'a' if resume else 'w')
+
+    def key(self, host: str, port: int, protocol: str, address: Any = None) -> Tuple:
+        """Identify a probe (see probe_key())."""
+        return probe_key(host, port, protocol, address, self.all_addresses)
+
+    def _read(self) -> Iterator[Dict]:
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    def previous_results(self) -> Iterator[Dict]:
+        """
+        Yield the results recorded by the run being resumed.
+
+        The state file is read again rather than held in memory; call this
+        before any new results are recorded.
+        """
+        if self._resumed:
+            self.flush()
+            yield from self._read()
+
+    def pending(self, probes: Iterable[Tuple[str, int, Any]],
+                protocol: str) -> Iterator[Tuple[str, int, Any]]:
+        """Filter out probes that already completed in a previous run."""
+        return skip_done(probes, self.done, protocol, self.all_addresses)
+
+    def record(self, result: Dict) -> None:
+        """Buffer a completed result, flushing to disk once per interval."""
+        self._buffer.append(json.dumps(result, separators=(',', ':')))
+        if time.monotonic() - self._flushed >= CHECKPOINT_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered records to the state file."""
+        if self._buffer:
+            self._file.write('\n'.join(self._buffer) + '\n')
+            self._file.flush()
+            self._buffer = []
+        self._flushed = time.monotonic()
+
+    def close(self) -> None:
+        """Flush and close the state file."""
+        self.flush()
+        self._file.close()
+
+
+def scan(probes: Iterable[Tuple[str, int, Any]], timeout: float = 5, protocol: str = 'tcp',
+         workers: int = 10, engine: str = 'thread',
+         on_result: Optional[Callable[[Dict], None]] = None,
+         adaptive: bool = False, min_timeout: float = MIN_TIMEOUT,
+         rate: Optional[float] = None, aimd: bool = False,
+         progress: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    Check an iterable of (host, port) probes concurrently.
+
+    Args:
+        probes: Iterable of (host, port, address) probes from iter_probes(),
+                consumed lazily
+        timeout: Connection timeout in seconds (the upper bound when adaptive)
+        protocol: Protocol to use ('tcp' or 'udp')
+        workers: Number of concurrent workers (threads or in-flight connects)
+        engine: Scan engine to use ('thread', 'async' or 'select')
+        on_result: Called with each result as soon as it completes. When
+                   given, results are not collected and an empty list is
+                   returned, so memory does not grow with the scan size.
+                   Raising ScanStopped from it ends the scan: queued probes
+                   are dropped and in-flight ones abandoned.
+        adaptive: Derive per-host timeouts from observed RTTs and retry
+                  timed-out probes once (see ProbeTimeouts)
+        min_timeout: Lower bound for adaptive timeouts in seconds
+        rate: Maximum connection attempts per second (None for unlimited)
+        aimd: Adapt the number of probes in flight to congestion, up to
+              `workers` (see ScanThrottle)
+        progress: Called about once a second with a dict of 'completed',
+                  'rate' (results/s over the last interval) and 'concurrency'
+
+    Returns:
+        List of result dictionaries sorted by host and port
+    """
+    results = []
+    sink = on_result or results.append
+    timeouts = ProbeTimeouts(timeout, adaptive, min_timeout)
+    if engine != 'thread':
+        workers = raise_fd_limit(workers)
+    throttle = ScanThrottle(workers, rate, aimd)
+    meter = {'completed': 0, 'last_completed': 0, 'last_time': time.monotonic()}
+    stopped = False
+
+    def emit(result: Dict) -> None:
+        nonlocal stopped
+        if stopped:
+            # Probes the engine had already finished when the scan was stopped
+            raise ScanStopped()
+        throttle.observe(result)
+        meter['completed'] += 1
+        if progress:
+            now = time.monotonic()
+            elapsed = now - meter['last_time']
+            if elapsed >= PROGRESS_INTERVAL:
+                progress({
+                    'completed': meter['completed'],
+                    'rate': (meter['completed'] - meter['last_completed']) / elapsed,
+                    'concurrency': throttle.concurrency,
+                })
+                meter['last_completed'] = meter['completed']
+                meter['last_time'] = now
+        try:
+            sink(result)
+        except ScanStopped:
+            stopped = True
+            raise
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}' (choose from: {', '.join(ENGINES)})")
+
+    try:
+        if engine == 'async':
+            asyncio.run(_scan_async(probes, timeouts, protocol, throttle, emit))
+        elif engine == 'select' and protocol.lower() == 'udp':
+            _scan_udp(probes, timeouts, throttle, emit)
+        elif engine == 'select':
+            _scan_selectors(probes, timeouts, throttle, emit)
+        else:
+            _scan_threads(probes, timeouts, protocol, throttle, emit)
+    except ScanStopped:
+        pass
+
+    return sorted(results, key=result_sort_key)
+
+
 def check_port_range(host: str, start_port: int, end_port: int,
-                     timeout: int = 5, protocol: str = 'tcp',
-                     workers: int = 10) -> List[Dict]:
+                     timeout: float = 5, protocol: str = 'tcp',
+                     workers: int = 10, engine: str = 'thread') -> List[Dict]:
     """
     Check multiple ports concurrently.
 
@@ -96,34 +1268,360 @@ def check_port_range(host: str, start_port: int, end_port: int,
         end_port: Ending port number (inclusive)
         timeout: Connection timeout in seconds
         protocol: Protocol to use ('tcp' or 'udp')
-        workers: Number of concurrent workers
+        workers: Number of concurrent workers (threads or in-flight connects)
+        engine: Scan engine to use ('thread', 'async' or 'select')
 
     Returns:
         List of result dictionaries for each port
     """
-    results = []
+    probes = iter_probes([host], range(start_port, end_port + 1))
+    return scan(probes, timeout, protocol, workers, engine)
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {
-            executor.submit(check_port, host, port, timeout, protocol): port
-            for port in range(start_port, end_port + 1)
-        }
 
-        for future in as_completed(futures):
+def iter_targets(specs: Iterable[str]) -> Iterator[str]:
+    """
+    Expand target specifications into individual hosts, lazily.
+
+    Each spec may be a hostname, an IP address, a CIDR block (e.g.
+    '10.0.0.0/24'), a comma-separated list of any of these, or '@file' to read
+    one spec per line from a file ('#' starts a comment).
+
+    Raises:
+        ValueError: If a target file cannot be read
+    """
+    for spec in specs:
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+
+            if item.startswith('@'):
+                try:
+                    with open(item[1:], 'r') as f:
+                        lines = [line.split('#', 1)[0].strip() for line in f]
+                except OSError as e:
+                    raise ValueError(f'Cannot read target file {item[1:]}: {e}')
+                yield from iter_targets(line for line in lines if line)
+            elif '/' in item:
+                try:
+                    network = ipaddress.ip_network(item, strict=False)
+                except ValueError:
+                    raise ValueError(f'Invalid CIDR block: {item}')
+                if network.num_addresses == 1:
+                    yield str(network.network_address)
+                else:
+                    yield from (str(address) for address in network.hosts())
+            else:
+                yield item
+
+
+def iter_probes(hosts: Iterable[str], ports: Sequence[int],
+                block_size: int = HOST_BLOCK_SIZE,
+                resolver: Optional[ResolverCache] = None,
+                all_addresses: bool = False) -> Iterator[Tuple[str, int, Any]]:
+    """
+    Interleave hosts and ports into (host, port, address) probes without
+    building the full cartesian product.
+
+    Hosts are taken `block_size` at a time and resolved together before the
+    block is scanned. Within a block every host gets one port before any host
+    gets the next, so consecutive probes are spread across the block rather
+    than hammering a single host.
+
+    Args:
+        hosts: Target hosts, consumed lazily
+        ports: Ports to probe on every host
+        block_size: Number of hosts interleaved at a time
+        resolver: Resolver cache to use (default: DEFAULT_RESOLVER)
+        all_addresses: Probe every resolved address instead of only the first
+
+    Yields:
+        (host, port, address) tuples; address is the socket.gaierror of the
+        lookup when the host cannot be resolved
+    """
+    resolver = resolver or DEFAULT_RESOLVER
+    host_iter = iter(hosts)
+    while True:
+        block = list(itertools.islice(host_iter, block_size))
+        if not block:
+            return
+
+        resolver.prefetch(block)
+        targets = []
+        for host in block:
             try:
-                results.append(future.result())
-            except Exception as e:
-                port = futures[future]
-                results.append({
-                    'host': host,
-                    'port': port,
-                    'protocol': protocol,
-                    'open': False,
-                    'error': f'Check failed: {e}',
-                    'latency_ms': None
-                })
+                addresses = resolver.resolve(host)
+            except socket.gaierror as e:
+                targets.append((host, e))
+                continue
+            for address in (addresses if all_addresses else addresses[:1]):
+                targets.append((host, address))
+
+        for port in ports:
+            for host, address in targets:
+                yield host, port, address
+
+
+def _scan_shard(conn, targets: List[str], ports: Sequence[int], probe_options: Dict,
+                scan_options: Dict) -> None:
+    """
+    Worker process body for scan_sharded(): scan one shard, send results back.
+
+    The shard is either every host already resolved by the parent
+    (probe_options['resolved']) on a subset of ports, or every port on the
+    hosts at positions shard, shard + N, ... of the expanded targets, which
+    the worker resolves itself (probe_options['host_shard'] = (shard, N)).
+    """
+    batch = []
+    flushed = time.monotonic()
+
+    def flush() -> None:
+        nonlocal batch, flushed
+        if batch:
+            conn.send(('results', batch))
+            batch = []
+        flushed = time.monotonic()
+
+    def send(result: Dict) -> None:
+        batch.append(result)
+        if len(batch) >= SHARD_BATCH_SIZE or time.monotonic() - flushed >= SHARD_FLUSH_INTERVAL:
+            flush()
+
+    try:
+        all_addresses = probe_options['all_addresses']
+        resolved = probe_options['resolved']
+        if resolved is not None:
+            probes = ((host, port, address) for port in ports for host, address in resolved)
+        else:
+            shard, processes = probe_options['host_shard']
+            hosts = itertools.islice(iter_targets(targets), shard, None, processes)
+            resolver = ResolverCache(probe_options['dns_ttl'], probe_options['family'])
+            probes = iter_probes(hosts, ports, resolver=resolver, all_addresses=all_addresses)
+        if probe_options['done']:
+            probes = skip_done(probes, probe_options['done'],
+                               scan_options.get('protocol', 'tcp'), all_addresses)
+        scan(probes, on_result=send, **scan_options)
+        flush()
+        conn.send(('done', None))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+
+def scan_sharded(targets: List[str], ports: Sequence[int], processes: int,
+                 on_result: Callable[[Dict], None], dns_ttl: float = DNS_TTL,
+                 family: int = socket.AF_UNSPEC, all_addresses: bool = False,
+                 done: Optional[set] = None,
+                 progress: Optional[Callable[[Dict], None]] = None,
+                 **scan_options) -> None:
+    """
+    Scan targets × ports across several worker processes.
+
+    With at least `processes` hosts, worker k scans every port on hosts k,
+    k + N, ... of the expanded targets, so each host is resolved once, by the
+    worker that owns it. With fewer hosts, the parent resolves them and the
+    port list is split into interleaved shards (ports[k::N]) instead, so even
+    a single host is spread evenly. Each worker runs scan() with its own
+    engine and sends results back over a pipe in batches; the parent passes
+    every result to `on_result`.
+
+    Args:
+        targets: Target specifications, as accepted by iter_targets()
+        ports: Ports to probe on every host
+        processes: Number of worker processes
+        on_result: Called in the parent with each result
+        dns_ttl: DNS cache TTL for the resolvers
+        family: Address family for the resolvers
+        all_addresses: Probe every resolved address of each host
+        done: probe_key()s to skip (from a resumed checkpoint)
+        progress: Called about once a second with 'completed' and 'rate'
+        **scan_options: Passed to scan() in every worker; 'rate' is divided
+                        between the workers
+
+    Raises:
+        RuntimeError: If a worker process fails
+    """
+    if scan_options.get('rate'):
+        scan_options['rate'] /= processes
+    hosts = list(itertools.islice(iter_targets(targets), processes))
+    resolved = None
+    if len(hosts) < processes:
+        resolver = ResolverCache(dns_ttl, family)
+        resolver.prefetch(hosts)
+        resolved = []
+        for host in hosts:
+            try:
+                addresses = resolver.resolve(host)
+            except socket.gaierror as e:
+                resolved.append((host, e))
+                continue
+            resolved.extend((host, address)
+                            for address in (addresses if all_addresses else addresses[:1]))
+
+    workers = {}
+    try:
+        for shard in range(processes):
+            shard_ports = ports[shard::processes] if resolved is not None else ports
+            if not shard_ports:
+                continue
+            probe_options = {'dns_ttl': dns_ttl, 'family': family, 'resolved': resolved,
+                             'host_shard': (shard, processes),
+                             'all_addresses': all_addresses, 'done': done}
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_scan_shard, daemon=True,
+                args=(sender, targets, shard_ports, probe_options, scan_options))
+            process.start()
+            sender.close()
+            workers[receiver] = process
+
+        completed = last_completed = 0
+        last_time = time.monotonic()
+        while workers:
+            for conn in wait_connections(list(workers), timeout=PROGRESS_INTERVAL):
+                try:
+                    kind, payload = conn.recv()
+                except EOFError:
+                    kind, payload = 'error', 'worker process exited unexpectedly'
+
+                if kind == 'results':
+                    for result in payload:
+                        on_result(result)
+                    completed += len(payload)
+                elif kind == 'error':
+                    raise RuntimeError(f'Scan worker failed: {payload}')
+                else:
+                    workers.pop(conn).join()
+                    conn.close()
+
+            now = time.monotonic()
+            if progress and now - last_time >= PROGRESS_INTERVAL:
+                progress({'completed': completed,
+                          'rate': (completed - last_completed) / (now - last_time)})
+                last_completed, last_time = completed, now
+    finally:
+        for conn, process in workers.items():
+            process.terminate()
+            conn.close()
+
+
+def result_state(result: Dict) -> str:
+    """Classify a result as 'open', 'closed', 'filtered', 'unknown' or 'error'."""
+    if result['open']:
+        return 'open'
+    if result['open'] is None:
+        return 'unknown'
+    if result['error'] == 'Connection timeout':
+        return 'filtered'
+    if result['error']:
+        return 'error'
+    return 'closed'
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of connect latencies in milliseconds."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.total = 0
+
+    def add(self, latency_ms: float) -> None:
+        """Count one latency sample."""
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+
+    def percentile(self, pct: float) -> float:
+        """Return the bucket upper bound below which `pct` percent of samples fall."""
+        if not self.total:
+            return 0.0
+        threshold = self.total * pct / 100
+        seen = 0
+        for count, bound in zip(self.counts, LATENCY_BUCKETS_MS):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the non-empty buckets and summary percentiles."""
+        return {
+            'samples': self.total,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'buckets': {f'le_{bound:g}': count
+                        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts) if count},
+        }
+
+    def format_lines(self, width: int = 40) -> List[str]:
+        """Render the histogram as text bars, one line per non-empty bucket."""
+        peak = max(self.counts) or 1
+        lines = []
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            if count:
+                label = f'<= {bound:g}ms' if bound != float('inf') else '> 5000ms'
+                lines.append(f"  {label:>11} {count:7} {'#' * max(1, count * width // peak)}")
+        return lines
 
-    return sorted(results, key=lambda x: x['port'])
+
+def watch(hosts: List[str], ports: Sequence[int], interval: float,
+          on_change: Callable[[Dict, Optional[str], str], None],
+          histograms: Dict[Tuple, LatencyHistogram],
+          resolver: Optional[ResolverCache] = None, all_addresses: bool = False,
+          rounds: Optional[int] = None, **scan_options) -> None:
+    """
+    Re-check the same targets every `interval` seconds, reporting only changes.
+
+    Rounds start on a fixed schedule (a round that overruns the interval is
+    followed immediately by the next). The resolver cache is shared between
+    rounds, so names are only looked up again when their TTL expires.
+
+    Args:
+        hosts: Target hosts
+        ports: Ports to check on every host
+        interval: Seconds between the starts of consecutive rounds
+        on_change: Called as on_change(result, previous_state, state) for
+                   every probe whose state differs from the previous round
+                   (previous_state is None in the first round)
+        histograms: Filled with a LatencyHistogram per (host, address, port)
+        resolver: Resolver cache to reuse across rounds
+        all_addresses: Probe every resolved address of each host
+        rounds: Stop after this many rounds (default: run until interrupted)
+        **scan_options: Passed through to scan()
+    """
+    resolver = resolver or DEFAULT_RESOLVER
+    states = {}
+    completed = 0
+
+    def observe(result: Dict) -> None:
+        key = (result['host'], result['address'] if all_addresses else None, result['port'])
+        state = result_state(result)
+        previous = states.get(key)
+        if state == 'open' and result['latency_ms'] is not None:
+            histograms.setdefault(key, LatencyHistogram()).add(result['latency_ms'])
+        if state != previous:
+            states[key] = state
+            on_change(result, previous, state)
+
+    next_start = time.monotonic()
+    while rounds is None or completed < rounds:
+        probes = iter_probes(hosts, ports, resolver=resolver, all_addresses=all_addresses)
+        scan(probes, on_result=observe, **scan_options)
+        completed += 1
+
+        if rounds is not None and completed >= rounds:
+            break
+        next_start += interval
+        delay = next_start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_start = time.monotonic()
 
 
 def validate_port(port: int) -> bool:
@@ -131,67 +1629,181 @@ def validate_port(port: int) -> bool:
     return 1 <= port <= 65535
 
 
-def parse_port_argument(port_arg: str) -> Tuple[int, int]:
+def parse_port_argument(port_arg: str, protocol: str = 'tcp') -> List[int]:
     """
-    Parse port argument which can be a single port or range.
+    Parse a port argument into the list of ports to probe, in order.
+
+    The argument is a comma-separated list of single ports, 'start-end'
+    ranges and 'topN' (the N ports most often found open for `protocol`),
+    e.g. '22', '80-443', '22,80,8000-8100' or 'top100,8443'. Duplicates are
+    dropped, keeping the first occurrence.
 
     Args:
-        port_arg: Port string (e.g., '80' or '80-443')
+        port_arg: Port string (e.g., '80', '80-443' or 'top20,8080')
+        protocol: Protocol whose top-ports list 'topN' refers to
 
     Returns:
-        Tuple of (start_port, end_port)
+        List of port numbers in the order given
 
     Raises:
         ValueError: If port format is invalid
     """
-    if '-' in port_arg:
-        parts = port_arg.split('-')
-        if len(parts) != 2:
-            raise ValueError('Invalid port range format. Use: start-end (e.g., 80-443)')
+    ports = []
+    for item in port_arg.split(','):
+        item = item.strip()
+        if not item:
+            continue
 
-        start_port = int(parts[0])
-        end_port = int(parts[1])
+        if item.lower().startswith('top'):
+            top = TOP_PORTS[protocol.lower()]
+            count = int(item[3:])
+            if not 1 <= count <= len(top):
+                raise ValueError(f'Top ports count must be between 1 and {len(top)} for {protocol}')
+            ports.extend(top[:count])
+        elif '-' in item:
+            parts = item.split('-')
+            if len(parts) != 2:
+                raise ValueError('Invalid port range format. Use: start-end (e.g., 80-443)')
 
-        if start_port > end_port:
-            raise ValueError('Start port must be less than or equal to end port')
+            start_port = int(parts[0])
+            end_port = int(parts[1])
 
-        if not validate_port(start_port) or not validate_port(end_port):
-            raise ValueError('Port numbers must be between 1 and 65535')
+            if start_port > end_port:
+                raise ValueError('Start port must be less than or equal to end port')
 
-        return start_port, end_port
-    else:
-        port = int(port_arg)
-        if not validate_port(port):
-            raise ValueError('Port number must be between 1 and 65535')
-        return port, port
+            if not validate_port(start_port) or not validate_port(end_port):
+                raise ValueError('Port numbers must be between 1 and 65535')
+
+            ports.extend(range(start_port, end_port + 1))
+        else:
+            port = int(item)
+            if not validate_port(port):
+                raise ValueError('Port number must be between 1 and 65535')
+            ports.append(port)
+
+    if not ports:
+        raise ValueError('No ports given')
+    return list(dict.fromkeys(ports))
+
+
+def order_ports(ports: Sequence[int], protocol: str = 'tcp') -> List[int]:
+    """Move ports from TOP_PORTS to the front, most common first; keep the rest in order."""
+    top = TOP_PORTS[protocol.lower()]
+    wanted = set(ports)
+    first = [port for port in top if port in wanted]
+    ranked = set(first)
+    return first + [port for port in ports if port not in ranked]
+
+
+def format_endpoint(result: Dict, show_address: bool = False) -> str:
+    """Format a result's host and port, bracketing IPv6 literals."""
+    host = f"[{result['host']}]" if ':' in result['host'] else result['host']
+    if show_address and result.get('address') and result['address'] != result['host']:
+        host = f"{host} ({result['address']})"
+    return f"{host}:{result['port']}"
 
 
-def format_output_text(results: List[Dict], verbose: bool = False) -> None:
+def format_output_text(results: Iterable[Dict], verbose: bool = False,
+                       show_address: bool = False) -> None:
     """Format and print results in human-readable text."""
     for r in results:
+        endpoint = format_endpoint(r, show_address)
         if r['open']:
             status = '✓ OPEN'
             latency = f" ({r['latency_ms']}ms)" if r['latency_ms'] else ''
-            print(f"{status:10} {r['host']}:{r['port']}{latency}")
+            print(f"{status:10} {endpoint}{latency}")
         elif r['open'] is None:  # UDP unknown
             status = '? UNKNOWN'
-            print(f"{status:10} {r['host']}:{r['port']} - {r['error']}")
+            print(f"{status:10} {endpoint} - {r['error']}")
         else:
             if verbose:
                 status = '✗ CLOSED'
                 error_msg = f" - {r['error']}" if r['error'] else ''
-                print(f"{status:10} {r['host']}:{r['port']}{error_msg}")
+                print(f"{status:10} {endpoint}{error_msg}")
+
+
+def format_output_json(results: Iterable[Dict]) -> None:
+    """
+    Format and print results as a JSON array.
+
+    Items are encoded one at a time, so the output matches
+    json.dumps(list(results), indent=2) without building it in memory.
+    """
+    first = True
+    for result in results:
+        item = json.dumps(result, indent=2).replace('\n', '\n  ')
+        sys.stdout.write(f"[\n  {item}" if first else f",\n  {item}")
+        first = False
+    print("[]" if first else "\n]")
+
 
+def format_output_ndjson(result: Dict) -> None:
+    """Print a single result as one line of newline-delimited JSON."""
+    print(json.dumps(result, separators=(',', ':')), flush=True)
 
-def format_output_json(results: List[Dict]) -> None:
-    """Format and print results as JSON."""
-    print(json.dumps(results, indent=2))
+
+def format_histograms(histograms: Dict[Tuple, LatencyHistogram], as_json: bool = False) -> str:
+    """Format watch-mode latency histograms as text or JSON."""
+    if as_json:
+        return json.dumps([
+            {'host': host, 'address': address, 'port': port, **histogram.to_dict()}
+            for (host, address, port), histogram in sorted(histograms.items(), key=str)
+        ], indent=2)
+
+    lines = []
+    for (host, address, port), histogram in sorted(histograms.items(), key=str):
+        endpoint = format_endpoint({'host': host, 'address': address, 'port': port}, True)
+        lines.append(f"{endpoint} - {histogram.total} samples, "
+                     f"p50 <= {histogram.percentile(50):g}ms, p99 <= {histogram.percentile(99):g}ms")
+        lines.extend(histogram.format_lines())
+    return "\n".join(lines) if lines else "No latency samples yet"
+
+
+def run_watch(args: argparse.Namespace, hosts: List[str], ports: Sequence[int],
+              resolver: ResolverCache) -> int:
+    """Run watch mode from parsed arguments until interrupted; return the exit code."""
+    histograms = {}
+
+    def on_change(result: Dict, previous: Optional[str], state: str) -> None:
+        if args.json:
+            event = dict(result, time=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                         previous=previous, state=state)
+            format_output_ndjson(event)
+        elif previous is not None or state != 'closed' or args.verbose:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            change = f"{previous} -> {state}" if previous else state
+            latency = f" ({result['latency_ms']}ms)" if state == 'open' else ''
+            error = f" - {result['error']}" if result['error'] else ''
+            print(f"{stamp} {format_endpoint(result, args.all_addresses)} "
+                  f"{change}{latency}{error}", flush=True)
+
+    def dump_histograms(*_) -> None:
+        print(format_histograms(histograms, args.json), file=sys.stderr, flush=True)
+
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, dump_histograms)
+
+    if not args.json:
+        print(f"Watching {' '.join(args.targets)} ports {args.port} "
+              f"every {args.watch:g}s (Ctrl-C to stop)", flush=True)
+
+    try:
+        watch(hosts, ports, args.watch, on_change, histograms,
+              resolver=resolver, all_addresses=args.all_addresses,
+              timeout=args.timeout, protocol=args.protocol, workers=args.workers,
+              engine=args.engine, adaptive=args.adaptive, min_timeout=args.min_timeout,
+              rate=args.rate, aimd=args.aimd)
+    except KeyboardInterrupt:
+        print("", file=sys.stderr)
+        dump_histograms()
+
+    return 0
 
 
 def main():
     """Main entry point for the port checker."""
     parser = argparse.ArgumentParser(
-        description='Check if TCP/UDP ports are open on a host',
+        description='Check if TCP/UDP ports are open on one or more hosts',
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
@@ -199,62 +1811,279 @@ Examples:
   %(prog)s 192.168.1.1 22 --timeout 5
   %(prog)s example.com 80-443 --json
   %(prog)s example.com 53 --protocol udp
+  %(prog)s 10.0.0.1 1-1024 --protocol udp --engine select
   %(prog)s 10.0.0.1 1-1024 --workers 50
+  %(prog)s 10.0.0.1 1-65535 --engine async --workers 5000
+  %(prog)s 10.0.0.1 1-65535 --engine select
+  %(prog)s 10.0.0.0/24 22 --engine async
+  %(prog)s web1,web2 db1 @hosts.txt 443
+  %(prog)s example.com 443 --all-addresses
+  %(prog)s -6 example.com 80-443
+  %(prog)s 10.0.0.0/16 1-1024 --json --stream | jq -c 'select(.open)'
+  %(prog)s 192.168.1.10 1-65535 --engine select --adaptive
+  %(prog)s 10.0.0.0/24 1-1024 --engine async --rate 2000 --aimd -v
+  %(prog)s 10.0.0.0/16 1-65535 --engine select --state-file scan.state
+  %(prog)s 10.0.0.0/16 1-65535 --engine select --state-file scan.state --resume
+  %(prog)s web1,web2 443 --watch 60 --adaptive
+  %(prog)s 10.0.0.0/16 1-65535 --engine select --processes 8
+  %(prog)s example.com 22,80,443,8000-8100
+  %(prog)s 10.0.0.5 top100 --engine async
+  %(prog)s db1 1-65535 --top-first --first-open
+  %(prog)s 10.0.0.0/24 22 --engine select --stop-after 5
         """
     )
 
-    parser.add_argument('host', help='Target hostname or IP address')
-    parser.add_argument('port', help='Port number or range (e.g., 80 or 80-443)')
-    parser.add_argument('-t', '--timeout', type=int, default=5,
-                       help='Connection timeout in seconds (default: 5)')
+    parser.add_argument('targets', nargs='+', metavar='host',
+                       help='Target hostname, IP address, CIDR block, comma-separated '
+                            'list, or @file with one target per line')
+    parser.add_argument('port', help='Port number, range, topN, or a comma-separated '
+                                     'mix of these (e.g., 80, 80-443 or top20,8080)')
+    parser.add_argument('-t', '--timeout', type=float, default=5,
+                       help='Connection timeout in seconds, fractions allowed (default: 5)')
+    parser.add_argument('-a', '--adaptive', action='store_true',
+                       help='Shrink per-host timeouts towards the measured RTT '
+                            'and retry timed-out probes once')
+    parser.add_argument('--min-timeout', type=float, default=MIN_TIMEOUT,
+                       help=f'Lower bound for adaptive timeouts in seconds (default: {MIN_TIMEOUT})')
     parser.add_argument('-p', '--protocol', choices=['tcp', 'udp'], default='tcp',
                        help='Protocol to use (default: tcp)')
     parser.add_argument('-j', '--json', action='store_true',
                        help='Output results in JSON format')
     parser.add_argument('-v', '--verbose', action='store_true',
                        help='Show closed ports (only affects text output)')
-    parser.add_argument('-w', '--workers', type=int, default=10,
-                       help='Number of concurrent workers for port ranges (default: 10)')
+    parser.add_argument('-o', '--open-only', action='store_true',
+                       help='Only keep and report open (or UDP unknown) ports; '
+                            'closed and filtered ports are counted but not stored')
+    parser.add_argument('-s', '--stream', action='store_true',
+                       help='Print each result as soon as it completes '
+                            '(NDJSON with --json) instead of sorting at the end')
+    parser.add_argument('--reorder', type=int, default=0, metavar='N',
+                       help='With --stream, hold up to N results to emit them in port order')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                       help='Number of concurrent workers for port ranges '
+                            '(default: 10 for thread, 1000 for async, 5000 for select)')
+    parser.add_argument('-r', '--rate', type=float, default=None,
+                       help='Maximum connection attempts per second (default: unlimited)')
+    parser.add_argument('--aimd', action='store_true',
+                       help='Adapt concurrency to congestion: back off on timeouts '
+                            'and EAGAIN/ENOBUFS, ramp up on success (up to --workers)')
+    parser.add_argument('--watch', type=float, metavar='INTERVAL',
+                       help='Re-check every INTERVAL seconds and report only state changes; '
+                            'latency histograms are printed on SIGUSR1 and on exit')
+    parser.add_argument('-P', '--processes', type=int, default=1,
+                       help='Split the scan across N worker processes, by host when there '
+                            'are at least N hosts and by port otherwise, each running '
+                            'its own engine with --workers (default: 1)')
+    parser.add_argument('--state-file', metavar='PATH',
+                       help='Append completed results to PATH so the scan can be resumed')
+    parser.add_argument('--resume', action='store_true',
+                       help='Skip probes already recorded in --state-file')
+    parser.add_argument('--top-first', action='store_true',
+                       help='Probe the most commonly open ports first instead of in the given order')
+    parser.add_argument('--stop-after', type=int, metavar='N',
+                       help='Stop as soon as N open ports are found, cancelling outstanding probes')
+    parser.add_argument('--first-open', action='store_const', const=1, dest='stop_after',
+                       help='Stop at the first open port (same as --stop-after 1)')
+    parser.add_argument('-e', '--engine', choices=ENGINES, default='thread',
+                       help="Scan engine for port ranges: 'thread' (a pool of blocking "
+                            "connects), 'async' (asyncio) or 'select' (non-blocking sockets "
+                            "on one selector; also multiplexes UDP) (default: thread)")
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument('-4', '--ipv4', action='store_true',
+                       help='Only use IPv4 addresses')
+    family.add_argument('-6', '--ipv6', action='store_true',
+                       help='Only use IPv6 addresses')
+    parser.add_argument('--all-addresses', action='store_true',
+                       help='Probe every address a hostname resolves to (A and AAAA)')
+    parser.add_argument('--dns-ttl', type=float, default=DNS_TTL,
+                       help=f'Seconds to cache DNS lookups (default: {DNS_TTL:.0f})')
 
     args = parser.parse_args()
 
+    if args.workers is None:
+        args.workers = DEFAULT_WORKERS[args.engine]
+    elif args.workers < 1:
+        print("Error: workers must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    if args.timeout <= 0 or args.min_timeout <= 0:
+        print("Error: timeouts must be greater than 0", file=sys.stderr)
+        sys.exit(1)
+
+    if args.rate is not None and args.rate <= 0:
+        print("Error: rate must be greater than 0", file=sys.stderr)
+        sys.exit(1)
+
+    if args.watch is not None and args.watch <= 0:
+        print("Error: watch interval must be greater than 0", file=sys.stderr)
+        sys.exit(1)
+
+    if args.processes < 1:
+        print("Error: processes must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    if args.watch is not None and args.processes > 1:
+        print("Error: --watch cannot be combined with --processes", file=sys.stderr)
+        sys.exit(1)
+
+    if args.watch is not None and args.state_file:
+        print("Error: --watch cannot be combined with --state-file", file=sys.stderr)
+        sys.exit(1)
+
+    if args.resume and not args.state_file:
+        print("Error: --resume requires --state-file", file=sys.stderr)
+        sys.exit(1)
+
+    if args.stop_after is not None and args.stop_after < 1:
+        print("Error: --stop-after must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    if args.watch is not None and args.stop_after:
+        print("Error: --watch cannot be combined with --stop-after/--first-open", file=sys.stderr)
+        sys.exit(1)
+
+    if args.reorder and not args.stream:
+        print("Error: --reorder requires --stream", file=sys.stderr)
+        sys.exit(1)
+
     # Parse port argument
     try:
-        start_port, end_port = parse_port_argument(args.port)
+        ports = parse_port_argument(args.port, args.protocol)
     except ValueError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    if args.top_first:
+        ports = order_ports(ports, args.protocol)
 
     # Perform port check(s)
+    checkpoint = None
     try:
-        if start_port == end_port:
-            # Single port
-            results = [check_port(args.host, start_port, args.timeout, args.protocol)]
+        if args.ipv4:
+            family = socket.AF_INET
+        elif args.ipv6:
+            family = socket.AF_INET6
         else:
-            # Port range
-            if not args.json and not args.verbose:
-                print(f"Scanning {args.host} ports {start_port}-{end_port}...")
-            results = check_port_range(
-                args.host, start_port, end_port,
-                args.timeout, args.protocol, args.workers
-            )
+            family = socket.AF_UNSPEC
+        resolver = ResolverCache(args.dns_ttl, family)
 
-        # Output results
-        if args.json:
-            format_output_json(results)
+        hosts = iter_targets(args.targets)
+        first_hosts = list(itertools.islice(hosts, 2))
+        if not first_hosts:
+            print("Error: no targets to scan", file=sys.stderr)
+            sys.exit(1)
+
+        if args.watch is not None:
+            sys.exit(run_watch(args, list(itertools.chain(first_hosts, hosts)),
+                               ports, resolver))
+
+        probes = iter_probes(itertools.chain(first_hosts, hosts), ports,
+                             resolver=resolver, all_addresses=args.all_addresses)
+
+        if args.state_file:
+            checkpoint = ScanCheckpoint(args.state_file, args.resume, args.all_addresses)
+            probes = checkpoint.pending(probes, args.protocol)
+
+        counts = {'checked': 0, 'open': 0}
+
+        def tally(result: Dict) -> None:
+            counts['checked'] += 1
+            if result['open'] is True:
+                counts['open'] += 1
+
+        def write_result(result: Dict) -> None:
+            if args.json:
+                format_output_ndjson(result)
+            else:
+                format_output_text([result], args.verbose, args.all_addresses)
+                sys.stdout.flush()
+
+        def report_progress(stats: Dict) -> None:
+            concurrency = (f", concurrency {stats['concurrency']}"
+                           if 'concurrency' in stats else '')
+            print(f"[{stats['completed']} checked, {stats['rate']:.0f} ports/s{concurrency}]",
+                  file=sys.stderr)
+
+        results = ResultStore(args.open_only)
+        reorder = ReorderBuffer(write_result, args.reorder) if args.reorder else None
+        if args.stream:
+            deliver = reorder.push if reorder else write_result
         else:
-            format_output_text(results, args.verbose)
+            deliver = results.add
 
-        # Exit code: 0 if all checked ports are open, 1 if any are closed/error
-        open_ports = [r for r in results if r['open'] is True]
-        if open_ports and len(open_ports) == len(results):
+        def on_result(result: Dict) -> None:
+            tally(result)
+            if checkpoint:
+                checkpoint.record(result)
+            if not args.open_only or result_state(result) not in ('closed', 'filtered'):
+                deliver(result)
+            if args.stop_after and counts['open'] >= args.stop_after:
+                raise ScanStopped()
+
+        if checkpoint:
+            # Results from the interrupted run were already streamed once
+            for result in checkpoint.previous_results():
+                tally(result)
+                if not args.stream:
+                    results.add(result)
+
+        try:
+            if len(ports) == 1 and len(first_hosts) == 1 and not args.all_addresses:
+                # Single host, single port
+                for host, port, address in probes:
+                    on_result(check_port(host, port, args.timeout, args.protocol, address))
+            else:
+                # Port range and/or multiple hosts
+                if not args.json and not args.verbose:
+                    print(f"Scanning {' '.join(args.targets)} ports {args.port}...", flush=True)
+                scan_options = dict(timeout=args.timeout, protocol=args.protocol,
+                                    workers=args.workers, engine=args.engine,
+                                    adaptive=args.adaptive, min_timeout=args.min_timeout,
+                                    rate=args.rate, aimd=args.aimd)
+                if args.processes > 1:
+                    scan_sharded(args.targets, ports, args.processes, on_result, dns_ttl=args.dns_ttl,
+                                 family=family, all_addresses=args.all_addresses,
+                                 done=checkpoint.done if checkpoint else None,
+                                 progress=report_progress if args.verbose else None,
+                                 **scan_options)
+                else:
+                    scan(probes, on_result=on_result,
+                         progress=report_progress if args.verbose else None,
+                         **scan_options)
+        except ScanStopped:
+            pass
+        finally:
+            # Results already completed are still written if the scan is interrupted
+            if reorder:
+                reorder.flush()
+            if checkpoint:
+                checkpoint.close()
+
+        # Output results
+        if not args.stream:
+            if args.json:
+                format_output_json(results.iter_sorted())
+            else:
+                format_output_text(results.iter_sorted(), args.verbose, args.all_addresses)
+
+        # Exit code: with --stop-after, 0 if enough open ports were found;
+        # otherwise 0 if all checked ports are open, 1 if any are closed/error
+        if args.stop_after:
+            sys.exit(0 if counts['open'] >= args.stop_after else 1)
+        if counts['open'] and counts['open'] == counts['checked']:
             sys.exit(0)
         else:
             sys.exit(1)
 
     except KeyboardInterrupt:
         print("\n\nScan interrupted by user", file=sys.stderr)
+        if checkpoint:
+            print(f"Progress saved to {args.state_file}; continue with --resume",
+                  file=sys.stderr)
         sys.exit(130)
+    except BrokenPipeError:
+        # The reader of a streamed scan (e.g. head) went away; stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
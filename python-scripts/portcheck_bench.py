@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for portcheck.py scan engines.
+
+Builds a local stand-in target on loopback (no network needed) and measures
+every engine/worker combination against it:
+
+  - listening ports that accept connections (open)
+  - ports with nothing bound (refused, i.e. closed)
+  - ports whose accept queue is full, so further SYNs are silently dropped
+    and probes time out (a stand-in for a filtering firewall)
+
+Each run happens in a fresh process so that peak RSS and CPU time belong to
+that run alone. Reports ports/sec, p50/p99 probe latency, peak RSS, CPU time
+and whether every port was classified correctly.
+
+Usage:
+    python3 portcheck_bench.py [options]
+    python3 portcheck_bench.py --engines async,select --workers 100,1000
+    python3 portcheck_bench.py --json > baseline.json
+    python3 portcheck_bench.py --baseline baseline.json --tolerance 15
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import portcheck  # noqa: E402
+
+HOST = '127.0.0.1'
+
+# Connections queued on a listen(0) socket before the kernel starts dropping SYNs
+FILLER_CONNECTIONS = 4
+
+
+class ListenerFarm:
+    """Open, refused and dropping ports on loopback for the duration of a benchmark."""
+
+    def __init__(self, listeners: int, refused: int, dropped: int):
+        self.sockets: List[socket.socket] = []
+        self.expected: Dict[int, str] = {}
+
+        for _ in range(listeners):
+            sock = self._bind()
+            sock.listen(128)
+            self.expected[sock.getsockname()[1]] = 'open'
+
+        # Bound but never listening: connections are refused, and keeping the
+        # sockets open stops later binds from reusing these port numbers
+        for _ in range(refused):
+            sock = self._bind()
+            self.expected[sock.getsockname()[1]] = 'closed'
+
+        # A backlog of 0 plus a few never-accepted connections makes the kernel
+        # drop further SYNs, so probes against these ports time out
+        for _ in range(dropped):
+            sock = self._bind()
+            sock.listen(0)
+            port = sock.getsockname()[1]
+            for _ in range(FILLER_CONNECTIONS):
+                filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                filler.setblocking(False)
+                filler.connect_ex((HOST, port))
+                self.sockets.append(filler)
+            self.expected[port] = 'filtered'
+
+        time.sleep(0.2)
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((HOST, 0))
+        self.sockets.append(sock)
+        return sock
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of farm ports expected in each state."""
+        counts = {'open': 0, 'closed': 0, 'filtered': 0}
+        for state in self.expected.values():
+            counts[state] += 1
+        return counts
+
+    def ports(self) -> List[int]:
+        """Return every farm port in a fixed shuffled order."""
+        ports = sorted(self.expected)
+        random.Random(0).shuffle(ports)
+        return ports
+
+    def close(self) -> None:
+        """Close every socket in the farm."""
+        for sock in self.sockets:
+            sock.close()
+        self.sockets = []
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Return the nearest-rank percentile of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def _run_scan(conn, ports: List[int], expected: Dict[int, str], engine: str,
+              workers: int, timeout: float) -> None:
+    """Child process body: scan the farm once and send back measurements."""
+    latencies = []
+    correct = 0
+
+    def on_result(result: Dict) -> None:
+        nonlocal correct
+        if result['latency_ms'] is not None:
+            latencies.append(result['latency_ms'])
+        if portcheck.result_state(result) == expected[result['port']]:
+            correct += 1
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    probes = ((HOST, port, HOST) for port in ports)
+    portcheck.scan(probes, timeout, 'tcp', workers, engine, on_result=on_result)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    peak_rss_kb = None
+    if resource is not None:
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_rss_kb //= 1024
+
+    conn.send({
+        'probes': len(ports),
+        'elapsed_s': elapsed,
+        'ports_per_sec': len(ports) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'peak_rss_kb': peak_rss_kb,
+        'cpu_s': cpu,
+        'correct': correct,
+    })
+    conn.close()
+
+
+def run_benchmark(farm: ListenerFarm, engine: str, workers: int,
+                  timeout: float) -> Dict[str, Any]:
+    """Scan the farm with one engine/worker setting in a fresh process."""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_scan,
+                              args=(sender, farm.ports(), farm.expected, engine,
+                                    workers, timeout))
+    process.start()
+    sender.close()
+    try:
+        data = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f'benchmark run {engine}/{workers} exited with code '
+                           f'{process.exitcode}')
+    finally:
+        process.join()
+        receiver.close()
+
+    data.update({'engine': engine, 'workers': workers})
+    return data
+
+
+def compare_to_baseline(runs: List[Dict], baseline: List[Dict],
+                        tolerance: float) -> List[str]:
+    """Return a message for every run that is slower than baseline by more than tolerance%."""
+    previous = {(run['engine'], run['workers']): run for run in baseline}
+    regressions = []
+    for run in runs:
+        before = previous.get((run['engine'], run['workers']))
+        if not before or not before['ports_per_sec']:
+            continue
+        change = (run['ports_per_sec'] - before['ports_per_sec']) / before['ports_per_sec'] * 100
+        if change < -tolerance:
+            regressions.append(f"{run['engine']}/{run['workers']}: "
+                               f"{before['ports_per_sec']:.0f} -> {run['ports_per_sec']:.0f} "
+                               f"ports/s ({change:+.1f}%)")
+    return regressions
+
+
+def format_text_output(runs: List[Dict], farm_size: Dict[str, int]) -> str:
+    """Format benchmark runs as a text table."""
+    def ms(value: Optional[float]) -> str:
+        return f"{value:.2f}" if value is not None else '-'
+
+    lines = []
+    lines.append("Portcheck Engine Benchmark")
+    lines.append("=" * 88)
+    lines.append(f"Target: {farm_size['open']} open, {farm_size['closed']} refused, "
+                 f"{farm_size['filtered']} dropping ports on {HOST}")
+    lines.append("")
+    lines.append(f"{'Engine':<8} {'Workers':>7} {'Ports/s':>10} {'p50 ms':>8} {'p99 ms':>9} "
+                 f"{'RSS MB':>8} {'CPU s':>7} {'Wall s':>7} {'Correct':>11}")
+    lines.append("-" * 88)
+    for run in runs:
+        rss = f"{run['peak_rss_kb'] / 1024:.1f}" if run['peak_rss_kb'] else '-'
+        lines.append(f"{run['engine']:<8} {run['workers']:>7} {run['ports_per_sec']:>10.0f} "
+                     f"{ms(run['p50_ms']):>8} {ms(run['p99_ms']):>9} {rss:>8} "
+                     f"{run['cpu_s']:>7.2f} {run['elapsed_s']:>7.2f} "
+                     f"{run['correct']:>5}/{run['probes']:<5}")
+    return "\n".join(lines)
+
+
+def parse_list(value: str) -> List[str]:
+    """Split a comma-separated option value."""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark portcheck.py scan engines against a local listener farm',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                   # All engines, default settings
+  %(prog)s --engines select --workers 1000,5000
+  %(prog)s --listeners 5000 --dropped 200 --timeout 0.5
+  %(prog)s --json > baseline.json            # Save a baseline
+  %(prog)s --baseline baseline.json          # Fail on >20%% slowdown
+        """
+    )
+
+    parser.add_argument('--listeners', type=int, default=2000,
+                        help='Number of open (listening) ports (default: 2000)')
+    parser.add_argument('--refused', type=int, default=2000,
+                        help='Number of refusing (closed) ports (default: 2000)')
+    parser.add_argument('--dropped', type=int, default=50,
+                        help='Number of ports that silently drop SYNs (default: 50)')
+    parser.add_argument('--engines', default=','.join(portcheck.ENGINES),
+                        help=f"Comma-separated engines (default: {','.join(portcheck.ENGINES)})")
+    parser.add_argument('--workers', default=None,
+                        help='Comma-separated worker counts (default: each engine\'s default)')
+    parser.add_argument('-t', '--timeout', type=float, default=1.0,
+                        help='Probe timeout in seconds (default: 1)')
+    parser.add_argument('--json', action='store_true',
+                        help='Output in JSON format')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='JSON output of an earlier run to compare ports/sec against')
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help='Allowed ports/sec slowdown versus --baseline in percent (default: 20)')
+
+    args = parser.parse_args()
+
+    engines = parse_list(args.engines)
+    unknown = [engine for engine in engines if engine not in portcheck.ENGINES]
+    if unknown:
+        print(f"Error: unknown engine(s): {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    try:
+        worker_counts = [int(w) for w in parse_list(args.workers)] if args.workers else None
+    except ValueError:
+        print("Error: --workers must be a comma-separated list of integers", file=sys.stderr)
+        return 1
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)['runs']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: cannot read baseline {args.baseline}: {e}", file=sys.stderr)
+            return 1
+
+    total_sockets = args.listeners + args.refused + args.dropped * (FILLER_CONNECTIONS + 1)
+    portcheck.raise_fd_limit(total_sockets)
+
+    farm = None
+    runs = []
+    farm_size = {}
+    try:
+        farm = ListenerFarm(args.listeners, args.refused, args.dropped)
+        farm_size = farm.counts()
+        for engine in engines:
+            for workers in worker_counts or [portcheck.DEFAULT_WORKERS[engine]]:
+                if not args.json:
+                    print(f"Running {engine} with {workers} workers...", file=sys.stderr)
+                runs.append(run_benchmark(farm, engine, workers, args.timeout))
+    except OSError as e:
+        print(f"Error: cannot build listener farm: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nBenchmark interrupted by user", file=sys.stderr)
+        return 130
+    finally:
+        if farm:
+            farm.close()
+
+    if args.json:
+        print(json.dumps({'target': farm_size, 'timeout': args.timeout, 'runs': runs}, indent=2))
+    else:
+        print(format_text_output(runs, farm_size))
+
+    status = 0
+    if any(run['correct'] != run['probes'] for run in runs):
+        print("Warning: some ports were misclassified (see Correct column)", file=sys.stderr)
+        status = 1
+
+    if baseline is not None:
+        regressions = compare_to_baseline(runs, baseline, args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}", file=sys.stderr)
+        if regressions:
+            status = 1
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,50 +5,397 @@ Command Benchmarking Tool
 Times command execution with support for multiple iterations, statistics,
 and comparison mode.
 
+Commands run without a shell where possible and are reported with their
+resource usage and latency percentiles. Load sweeps, parameter scans and a
+history of results for regression checks are also supported.
+
 Usage:
     python3 timer.py [options] command [command2 ...]
 """
 
 import argparse
+import functools
+import hashlib
+import itertools
 import json
+import math
+import os
+import platform
+import random
+import re
+import shlex
+import signal
 import statistics
 import subprocess
 import sys
+import tempfile
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Characters that make a command need /bin/sh (quotes are handled by shlex)
+SHELL_METACHARACTERS = set('|&;<>()$`*?[]{}~#!\n')
+
+# First words that only exist inside a shell
+SHELL_BUILTINS = {
+    '.', ':', 'alias', 'bg', 'break', 'case', 'cd', 'command', 'continue', 'eval',
+    'exec', 'exit', 'export', 'fg', 'for', 'function', 'if', 'jobs', 'read',
+    'readonly', 'return', 'set', 'shift', 'source', 'time', 'times', 'trap',
+    'type', 'ulimit', 'umask', 'unset', 'until', 'wait', 'while',
+}
+
+# What happens to the child's output: 'discard' (both streams to /dev/null),
+# 'tail' (stdout discarded, last STDERR_TAIL_BYTES of stderr kept for errors)
+# or 'count' (stdout drained through a pipe and only its size recorded)
+OUTPUT_POLICIES = ('discard', 'tail', 'count')
+
+# Bytes of a failed command's stderr kept for the error message
+STDERR_TAIL_BYTES = 4096
+
+# Read size when draining a counted stdout pipe
+PIPE_CHUNK_SIZE = 65536
+
+# Worker threads used by --rate when --parallel does not set a limit
+OPEN_LOOP_WORKERS = 64
+
+# Latency percentiles reported for every benchmark
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Latency histogram: significant bits per power of two (values kept to within
+# 1/128 for 8 bits), and the size of the --verbose ASCII histogram
+HISTOGRAM_SUB_BUCKET_BITS = 8
+HISTOGRAM_ROWS = 16
+HISTOGRAM_BAR_WIDTH = 40
+
+# Two-sided 95% Student's t critical values for 1..30 degrees of freedom
+T_CRITICAL_95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+Z_95 = 1.96
+
+# --precision: fewest samples before stopping, default time budget, and how
+# much the sample must grow between confidence interval checks
+MIN_ADAPTIVE_ITERATIONS = 5
+DEFAULT_MAX_TIME = 60.0
+PRECISION_CHECK_GROWTH = 1.1
+
+# --compare: bootstrap resamples (seeded so reruns print the same intervals),
+# default significance level, and fewest runs per command for a meaningful test
+BOOTSTRAP_RESAMPLES = 2000
+BOOTSTRAP_SEED = 0
+DEFAULT_ALPHA = 0.05
+MIN_COMPARE_ITERATIONS = 5
+
+# --save / --baseline: history file, overridable with $TIMER_HISTORY
+DEFAULT_HISTORY = os.environ.get('TIMER_HISTORY',
+                                 os.path.join(os.path.expanduser('~'), '.timer_history.jsonl'))
+
+# --calibrate: no-op commands timed over each spawn path
+CALIBRATION_COMMANDS = {True: ':', False: 'true'}
+
+# Noise check: CPU frequency sysfs files, the 1-minute load average per CPU
+# above which the machine counts as busy, and the clock spread worth a warning
+CPUFREQ_GOVERNOR_PATH = '/sys/devices/system/cpu/cpu{}/cpufreq/scaling_governor'
+INTEL_NO_TURBO_PATH = '/sys/devices/system/cpu/intel_pstate/no_turbo'
+CPUFREQ_BOOST_PATH = '/sys/devices/system/cpu/cpufreq/boost'
+NOISE_LOAD_PER_CPU = 0.25
+NOISE_MHZ_SPREAD = 1.25
+
+# --cold: kernel knob that drops the page cache, dentries and inodes on Linux
+DROP_CACHES_PATH = '/proc/sys/vm/drop_caches'
+
+# Modified z-score above which a sample is reported as an outlier
+OUTLIER_Z = 3.5
+
+# Per-iteration resource usage fields taken from wait4(); max_rss_kb may be missing
+USAGE_FIELDS = ('user_time', 'system_time', 'max_rss_kb', 'voluntary_switches',
+                'involuntary_switches', 'minor_faults', 'major_faults')
+
+
+class RunningStats:
+    """Count, mean, variance, min, max and total of a stream (Welford's algorithm)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.total = 0.0
+
+    def add(self, value: float):
+        """Add one value."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.total += value
+
+    def merge(self, other: 'RunningStats'):
+        """Combine another stream's statistics into this one (Chan et al.)."""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.total += other.total
+
+    @property
+    def stdev(self) -> float:
+        """Sample standard deviation."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram in the style of HdrHistogram.
+
+    Values are recorded as integer nanoseconds. Each power-of-two range is
+    split into 2**(sub_bucket_bits - 1) linear sub-buckets, so a value is
+    known to within 1/2**(sub_bucket_bits - 1) of itself at any magnitude.
+    Only non-empty buckets are stored, and there are at most a few thousand
+    of them however many values are recorded. Histograms with the same
+    layout merge by adding counts.
+    """
+
+    def __init__(self, sub_bucket_bits: int = HISTOGRAM_SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+
+    def _index(self, ns: int) -> int:
+        shift = max(0, ns.bit_length() - self.sub_bucket_bits)
+        return (shift << self.sub_bucket_bits) | (ns >> shift)
+
+    def bucket_range(self, index: int) -> Tuple[int, int]:
+        """Return the lowest and highest nanosecond values of a bucket."""
+        shift = index >> self.sub_bucket_bits
+        low = (index & ((1 << self.sub_bucket_bits) - 1)) << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, seconds: float, count: int = 1):
+        """Record a value in seconds, count times."""
+        index = self._index(max(0, round(seconds * 1e9)))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the nearest-rank pct-th percentile in seconds (bucket midpoint), or None."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                break
+        low, high = self.bucket_range(index)
+        return (low + high) / 2 / 1e9
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Add another histogram's counts to this one.
+
+        Raises:
+            ValueError: If the histograms have different layouts
+        """
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("cannot merge histograms with different sub-bucket sizes")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+
+    def bins(self, rows: int = HISTOGRAM_ROWS) -> List[Tuple[float, float, int]]:
+        """Group the buckets into at most `rows` log-spaced (low, high, count) bins in seconds."""
+        if not self.count:
+            return []
+        indexes = sorted(self.counts)
+        low = max(1, self.bucket_range(indexes[0])[0])
+        high = max(low + 1, self.bucket_range(indexes[-1])[1] + 1)
+        factor = (high / low) ** (1 / rows)
+        edges = [low * factor ** i for i in range(rows + 1)]
+        counts = [0] * rows
+        for index in indexes:
+            start, end = self.bucket_range(index)
+            midpoint = (start + end) / 2
+            row = min(rows - 1, max(0, int(math.log(max(midpoint, low) / low, factor))))
+            counts[row] += self.counts[index]
+        return [(edges[i] / 1e9, edges[i + 1] / 1e9, counts[i]) for i in range(rows)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Export as a JSON-friendly dict of [lowest value in ns, count] buckets."""
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'count': self.count,
+            'buckets': [[self.bucket_range(index)[0], self.counts[index]]
+                        for index in sorted(self.counts)],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        """Rebuild a histogram exported with to_dict()."""
+        histogram = cls(data['sub_bucket_bits'])
+        for low, count in data['buckets']:
+            index = histogram._index(low)
+            histogram.counts[index] = histogram.counts.get(index, 0) + count
+            histogram.count += count
+        return histogram
 
 
 class BenchmarkResult:
-    """Store and analyze benchmark results."""
+    """
+    Store and analyze benchmark results.
+
+    Timing and resource usage are accumulated online, and every time also
+    goes into a LatencyHistogram. Per-iteration samples are kept unless
+    keep_samples is False, in which case percentiles come from the
+    histogram and sample-based analyses (median CI, outliers, --compare,
+    per-iteration CSV) are unavailable.
+    """
 
-    def __init__(self, command: str, iterations: int):
+    def __init__(self, command: str, iterations: int, parallel: int = 1,
+                 rate: Optional[float] = None, keep_samples: bool = True):
         self.command = command
+        self.template = command
+        self.params: Dict[str, str] = {}
         self.iterations = iterations
+        self.parallel = parallel
+        self.rate = rate
+        self.keep_samples = keep_samples
+        self.wall_time = 0.0
+        self.precision: Optional[Dict[str, Any]] = None
+        self.baseline: Optional[Dict[str, Any]] = None
+        self.hooks: Dict[str, Any] = {}
+        self.overhead: Optional[Dict[str, Any]] = None
+        self.calibration: List[float] = []
+        self.merged_from: List[str] = []
+        self.environment: Optional[Dict[str, Any]] = None
+        self.running = RunningStats()
+        self.histogram = LatencyHistogram()
+        self.lag_stats = RunningStats()
+        self.usage_totals: Dict[str, float] = {}
+        self.usage_count = 0
         self.times: List[float] = []
+        self.lags: List[float] = []
+        self.successes: List[bool] = []
+        self.usage: List[Optional[Dict[str, float]]] = []
         self.success_count = 0
         self.failure_count = 0
 
-    def add_time(self, elapsed: float, success: bool = True):
-        """Add a timing result."""
-        self.times.append(elapsed)
+    @property
+    def count(self) -> int:
+        """Number of timed iterations so far."""
+        return self.running.count
+
+    def add_time(self, elapsed: float, success: bool = True,
+                 usage: Optional[Dict[str, float]] = None):
+        """Add a timing result, with the child's resource usage if known."""
+        self.running.add(elapsed)
+        self.histogram.record(elapsed)
+
+        if usage is not None:
+            self.usage_count += 1
+            for field, value in usage.items():
+                if field == 'max_rss_kb':
+                    self.usage_totals[field] = max(self.usage_totals.get(field, 0), value)
+                else:
+                    self.usage_totals[field] = self.usage_totals.get(field, 0) + value
+
+        if self.keep_samples:
+            self.times.append(elapsed)
+            self.successes.append(success)
+            self.usage.append(usage)
         if success:
             self.success_count += 1
         else:
             self.failure_count += 1
 
+    def add_lag(self, lag: float):
+        """Add how late an open-loop iteration started compared to its schedule."""
+        self.lag_stats.add(lag)
+        if self.keep_samples:
+            self.lags.append(lag)
+
+    def subtract_overhead(self, offset: float):
+        """Subtract a fixed cost from every sample, clamped at zero, and rebuild the statistics."""
+        self.times = [max(0.0, elapsed - offset) for elapsed in self.times]
+        self.running = RunningStats()
+        self.histogram = LatencyHistogram(self.histogram.sub_bucket_bits)
+        for elapsed in self.times:
+            self.running.add(elapsed)
+            self.histogram.record(elapsed)
+
     def get_statistics(self) -> Dict[str, float]:
         """Calculate timing statistics."""
-        if not self.times:
+        if not self.count:
             return {}
 
-        return {
-            'min': min(self.times),
-            'max': max(self.times),
-            'mean': statistics.mean(self.times),
-            'median': statistics.median(self.times),
-            'stdev': statistics.stdev(self.times) if len(self.times) > 1 else 0.0,
-            'total': sum(self.times)
+        if self.keep_samples:
+            ordered = sorted(self.times)
+            quantiles = {pct: percentile(ordered, pct, presorted=True) for pct in PERCENTILES}
+        else:
+            quantiles = {pct: min(self.running.max, max(self.running.min,
+                                                         self.histogram.percentile(pct)))
+                         for pct in PERCENTILES}
+
+        stats = {
+            'min': self.running.min,
+            'max': self.running.max,
+            'mean': self.running.mean,
+            'median': quantiles[50],
+            'stdev': self.running.stdev,
+            'total': self.running.total
         }
+        for pct in PERCENTILES:
+            stats[f'p{pct:g}'] = quantiles[pct]
+        if self.wall_time > 0:
+            stats['throughput'] = self.count / self.wall_time
+        if self.keep_samples:
+            stats['outliers'] = len(find_outliers(self.times))
+        return stats
+
+    def get_confidence_interval(self, statistic: str = 'mean') -> Optional[Tuple[float, float]]:
+        """Return the 95% confidence interval of the mean or median, or None if too few samples."""
+        if statistic == 'median':
+            return confidence_interval(self.times, statistic)
+        if self.count < 2:
+            return None
+        half_width = t_critical(self.count - 1) * self.running.stdev / math.sqrt(self.count)
+        return (self.running.mean - half_width, self.running.mean + half_width)
+
+    def get_relative_precision(self, statistic: str = 'mean') -> Optional[float]:
+        """Return the CI half-width as a fraction of the mean or median, or None if unknown."""
+        interval = self.get_confidence_interval(statistic)
+        if interval is None:
+            return None
+        center = self.get_statistics()['median'] if statistic == 'median' else self.running.mean
+        if center <= 0:
+            return None
+        return (interval[1] - interval[0]) / 2 / center
+
+    def load_label(self) -> str:
+        """Describe the load mode, e.g. 'sequential', 'parallel 4' or 'rate 50/s'."""
+        return format_load(self.parallel, self.rate)
+
+    def get_usage_statistics(self) -> Dict[str, float]:
+        """Calculate mean resource usage per iteration (peak for max RSS)."""
+        if not self.usage_count:
+            return {}
+
+        return {field: value if field == 'max_rss_kb' else value / self.usage_count
+                for field, value in self.usage_totals.items()}
 
     def format_time(self, seconds: float) -> str:
         """Format time in human-readable format."""
@@ -64,38 +411,736 @@ class BenchmarkResult:
             return f"{minutes}m {secs:.2f}s"
 
 
-def run_command(command: str, shell: bool = True, timeout: Optional[int] = None) -> tuple[float, bool, str]:
+def format_load(parallel: int, rate: Optional[float]) -> str:
+    """Describe a load level, e.g. 'sequential', 'parallel 4' or 'rate 50/s'."""
+    if rate:
+        return f"rate {rate:g}/s"
+    if parallel > 1:
+        return f"parallel {parallel}"
+    return "sequential"
+
+
+def percentile(values: List[float], pct: float, presorted: bool = False) -> float:
+    """Return the pct-th percentile of values, interpolating between samples."""
+    ordered = values if presorted else sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def confidence_interval(values: List[float], statistic: str = 'mean') -> Optional[Tuple[float, float]]:
+    """
+    Return a 95% confidence interval for the mean or median of values.
+
+    The mean uses Student's t; the median uses the distribution-free interval
+    between the order statistics n/2 ± 1.96·√n/2.
+
+    Returns:
+        (low, high), or None with fewer than two samples
+    """
+    n = len(values)
+    if n < 2:
+        return None
+
+    if statistic == 'median':
+        ordered = sorted(values)
+        spread = Z_95 * math.sqrt(n) / 2
+        low = max(0, math.floor(n / 2 - spread) - 1)
+        high = min(n - 1, math.ceil(n / 2 + spread) - 1)
+        return (ordered[low], ordered[high])
+
+    mean = statistics.mean(values)
+    half_width = t_critical(n - 1) * statistics.stdev(values) / math.sqrt(n)
+    return (mean - half_width, mean + half_width)
+
+
+def t_critical(df: int) -> float:
+    """Two-sided 95% Student's t critical value (Cornish-Fisher approximation above 30 df)."""
+    return T_CRITICAL_95[df - 1] if df <= len(T_CRITICAL_95) else Z_95 + 2.37 / df
+
+
+def find_outliers(values: List[float]) -> List[int]:
+    """Return indices of values whose modified z-score exceeds OUTLIER_Z."""
+    if len(values) < 3:
+        return []
+    median = statistics.median(values)
+    mad = statistics.median(abs(v - median) for v in values)
+    if mad == 0:
+        return []
+    return [i for i, v in enumerate(values) if 0.6745 * abs(v - median) / mad > OUTLIER_Z]
+
+
+def resampled_median(ordered: List[float], rng: random.Random) -> float:
+    """
+    Draw the median of one bootstrap resample of a sorted sample in O(1).
+
+    The k-th smallest of n uniform draws follows Beta(k, n + 1 - k), so the
+    resample's median is the original order statistic at that quantile; for
+    even n the next order statistic follows from the gap after it.
+    """
+    n = len(ordered)
+    k = (n + 1) // 2
+    u = rng.betavariate(k, n + 1 - k)
+    lower = ordered[min(n - 1, int(u * n))]
+    if n % 2:
+        return lower
+    u += (1 - u) * rng.betavariate(1, n - k)
+    return (lower + ordered[min(n - 1, int(u * n))]) / 2
+
+
+def bootstrap_ci(samples: List[List[float]],
+                 estimator: Callable[..., float] = lambda median: median,
+                 resamples: int = BOOTSTRAP_RESAMPLES) -> Tuple[float, float]:
+    """
+    Return a 95% percentile-bootstrap confidence interval for a function of medians.
+
+    Each sample is resampled independently. Resample medians are drawn with
+    resampled_median(), so the cost does not grow with the sample size.
+
+    Args:
+        samples: One or more non-empty samples
+        estimator: Called with one resampled median per sample, e.g. a ratio
+                   of medians (default: the median itself)
+        resamples: Number of bootstrap resamples
+
+    Returns:
+        (low, high)
+    """
+    rng = random.Random(BOOTSTRAP_SEED)
+    ordered = [sorted(sample) for sample in samples]
+    estimates = [estimator(*(resampled_median(sample, rng) for sample in ordered))
+                 for _ in range(resamples)]
+    return (percentile(estimates, 2.5), percentile(estimates, 97.5))
+
+
+def mann_whitney_u(a: List[float], b: List[float]) -> Tuple[float, float]:
+    """
+    Two-sided Mann-Whitney U test using the normal approximation.
+
+    Ties get average ranks and the variance is tie-corrected; a continuity
+    correction is applied.
+
+    Returns:
+        (U statistic of `a`, p-value)
+    """
+    n1, n2 = len(a), len(b)
+    combined = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    n = n1 + n2
+
+    rank_sum = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        rank_sum += average_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 0)
+        i = j + 1
+
+    u = rank_sum - n1 * (n1 + 1) / 2
+    mean_u = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))) if n > 1 else 0.0
+    if variance <= 0:
+        return (u, 1.0)
+
+    z = max(0.0, abs(u - mean_u) - 0.5) / math.sqrt(variance)
+    return (u, math.erfc(z / math.sqrt(2)))
+
+
+def compare_results(results: List[BenchmarkResult],
+                    alpha: float = DEFAULT_ALPHA) -> List[Dict[str, Any]]:
+    """
+    Compare every result against the first one (the baseline).
+
+    Returns:
+        One dict per result with 'baseline', 'median', 'median_ci' and, for
+        all but the baseline, 'ratio' and 'ratio_ci' (median over baseline
+        median), 'u_statistic', 'p_value' and 'verdict' ('faster', 'slower'
+        or 'no significant difference')
+    """
+    baseline = results[0]
+    comparisons = []
+
+    for result in results:
+        comparison = {'baseline': baseline.command}
+        if result.times:
+            comparison['median'] = statistics.median(result.times)
+            interval = confidence_interval(result.times, 'median')
+            comparison['median_ci'] = list(interval or (comparison['median'],) * 2)
+
+        if result is not baseline and result.times and baseline.times:
+            comparison.update(compare_samples(result.times, baseline.times, alpha))
+
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+def compare_samples(times: List[float], base_times: List[float],
+                    alpha: float = DEFAULT_ALPHA) -> Dict[str, Any]:
+    """
+    Compare two non-empty samples of run times.
+
+    Returns:
+        Dict with 'ratio' and 'ratio_ci' (median over base median, when the
+        base median is positive), 'u_statistic', 'p_value' and 'verdict'
+    """
+    comparison: Dict[str, Any] = {}
+    median = statistics.median(times)
+    base_median = statistics.median(base_times)
+    if base_median > 0:
+        comparison['ratio'] = median / base_median
+        comparison['ratio_ci'] = list(bootstrap_ci(
+            [times, base_times],
+            lambda median, base: median / (base or 1e-12)))
+
+    u, p_value = mann_whitney_u(times, base_times)
+    comparison['u_statistic'] = u
+    comparison['p_value'] = p_value
+    if p_value >= alpha:
+        comparison['verdict'] = 'no significant difference'
+    elif median < base_median:
+        comparison['verdict'] = 'faster'
+    else:
+        comparison['verdict'] = 'slower'
+    return comparison
+
+
+def apply_overhead(result: BenchmarkResult, overhead: List[float], subtract: bool,
+                   alpha: float = DEFAULT_ALPHA) -> None:
+    """
+    Record the spawn overhead in result.overhead and optionally subtract it.
+
+    The command is tested against the no-op runs before any subtraction;
+    'indistinguishable' is True when they show no significant difference.
+    """
+    median = statistics.median(overhead)
+    info = {
+        'iterations': len(overhead),
+        'median': median,
+        'mean': statistics.mean(overhead),
+        'stdev': statistics.stdev(overhead) if len(overhead) > 1 else 0.0,
+        'subtracted': subtract,
+    }
+    if result.times:
+        _, p_value = mann_whitney_u(result.times, overhead)
+        info['p_value'] = p_value
+        info['indistinguishable'] = p_value >= alpha
+    if subtract:
+        result.subtract_overhead(median)
+    result.overhead = info
+
+
+def export_histograms(path: str, results: List[BenchmarkResult], host: str) -> None:
+    """
+    Write each result's histogram and running statistics to a JSON file.
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    exported = []
+    for result in results:
+        exported.append({
+            'command': result.command,
+            'template': result.template,
+            'parameters': result.params,
+            'parallel': result.parallel,
+            'rate': result.rate,
+            'success_count': result.success_count,
+            'failure_count': result.failure_count,
+            'running': vars(result.running),
+            'histogram': result.histogram.to_dict(),
+        })
+
+    with open(path, 'w') as f:
+        json.dump({
+            'host': host,
+            'hostname': platform.node(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'results': exported,
+        }, f, indent=2)
+        f.write('\n')
+
+
+def merge_histograms(paths: List[str]) -> List[BenchmarkResult]:
+    """
+    Combine exported histograms that share a command and load into one result each.
+
+    Raises:
+        OSError: If a file cannot be read
+        ValueError: If a file is not a histogram export or layouts differ
+    """
+    merged: Dict[Tuple, BenchmarkResult] = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        try:
+            for entry in data['results']:
+                key = history_key(entry['command'], entry['parallel'], entry['rate'])
+                if key not in merged:
+                    result = BenchmarkResult(entry['command'], 0, entry['parallel'],
+                                             entry['rate'], keep_samples=False)
+                    result.template = entry.get('template', entry['command'])
+                    result.params = entry.get('parameters', {})
+                    merged[key] = result
+                result = merged[key]
+
+                running = RunningStats()
+                running.__dict__.update(entry['running'])
+                result.running.merge(running)
+                result.histogram.merge(LatencyHistogram.from_dict(entry['histogram']))
+                result.success_count += entry['success_count']
+                result.failure_count += entry['failure_count']
+                result.iterations = result.count
+                result.merged_from.append(data.get('hostname') or path)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"{path} is not a histogram export ({e})")
+    return list(merged.values())
+
+
+def _read_sysfs(path: str) -> Optional[str]:
+    """Return the stripped contents of a sysfs file, or None if it cannot be read."""
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def get_environment() -> Dict[str, Any]:
+    """
+    Snapshot the conditions that add noise to timings.
+
+    The allowed CPUs and nice value are those of the calling thread, which
+    on Linux can differ from the rest of the process.
+
+    Returns:
+        Dict with 'load_average', 'cpu_count', 'cpus' (allowed CPUs),
+        'nice', and where the system exposes them 'governors', 'mhz'
+        (current clock of each allowed CPU) and 'turbo'
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+    environment: Dict[str, Any] = {
+        'load_average': list(os.getloadavg()) if hasattr(os, 'getloadavg') else None,
+        'cpu_count': os.cpu_count(),
+        'cpus': cpus,
+        'nice': os.getpriority(os.PRIO_PROCESS, 0) if hasattr(os, 'getpriority') else None,
+    }
+
+    governors = {}
+    for cpu in cpus or []:
+        governor = _read_sysfs(CPUFREQ_GOVERNOR_PATH.format(cpu))
+        if governor:
+            governors[cpu] = governor
+    if governors:
+        environment['governors'] = sorted(set(governors.values()))
+
+    try:
+        mhz = {}
+        processor = None
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('processor'):
+                    processor = int(line.split(':')[1])
+                elif line.startswith('cpu MHz') and (cpus is None or processor in cpus):
+                    mhz[processor] = float(line.split(':')[1])
+        if mhz:
+            environment['mhz'] = [mhz[cpu] for cpu in sorted(mhz)]
+    except (OSError, ValueError):
+        pass
+
+    no_turbo = _read_sysfs(INTEL_NO_TURBO_PATH)
+    boost = _read_sysfs(CPUFREQ_BOOST_PATH)
+    if no_turbo is not None:
+        environment['turbo'] = no_turbo == '0'
+    elif boost is not None:
+        environment['turbo'] = boost == '1'
+
+    return environment
+
+
+def noise_warnings(environment: Dict[str, Any]) -> List[str]:
+    """Describe anything in an environment snapshot that is likely to skew timings."""
+    warnings = []
+    load = environment['load_average']
+    if load and load[0] > NOISE_LOAD_PER_CPU * (environment['cpu_count'] or 1):
+        warnings.append(f"load average is {load[0]:.2f} on {environment['cpu_count']} CPUs; "
+                        "other work competes with the benchmark")
+    if any(governor != 'performance' for governor in environment.get('governors', [])):
+        warnings.append(f"CPU frequency governor is {'/'.join(environment['governors'])}, "
+                        "not performance; clock speed follows load")
+    mhz = environment.get('mhz')
+    if mhz and min(mhz) > 0 and max(mhz) / min(mhz) > NOISE_MHZ_SPREAD:
+        warnings.append(f"CPU clocks range from {min(mhz):.0f} to {max(mhz):.0f} MHz")
+    if environment.get('turbo'):
+        warnings.append("turbo boost is enabled; clock speed varies with load and temperature")
+    return warnings
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """
+    Parse a CPU list such as '2', '0,2' or '4-7'.
+
+    Raises:
+        ValueError: If the list is malformed or empty
+    """
+    cpus = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        start, sep, end = item.partition('-')
+        first, last = int(start), int(end) if sep else int(start)
+        if first < 0 or last < first:
+            raise ValueError(f"invalid CPU range: {item}")
+        cpus.update(range(first, last + 1))
+    if not cpus:
+        raise ValueError("empty CPU list")
+    return sorted(cpus)
+
+
+def host_fingerprint() -> str:
+    """
+    Return a short hash identifying this kind of machine (OS, architecture, CPU model, CPU count).
+
+    The hostname is left out so that ephemeral CI runners on the same
+    hardware share baselines.
+    """
+    cpu_model = platform.processor()
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    cpu_model = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+
+    identity = '|'.join([platform.system(), platform.machine(), cpu_model, str(os.cpu_count())])
+    return hashlib.sha256(identity.encode()).hexdigest()[:12]
+
+
+def history_key(command: str, parallel: int, rate: Optional[float]) -> Tuple[str, int, Optional[float]]:
+    """Key that matches a result to its stored runs: the command and its load."""
+    return (command, parallel, rate)
+
+
+def load_history(path: str, label: str, host: str) -> Dict[Tuple, Dict[str, Any]]:
+    """
+    Read the latest stored run per command and load for a label on a host.
+
+    Lines that cannot be parsed (e.g. a write cut short) are skipped.
+
+    Raises:
+        OSError: If the history file cannot be read
+    """
+    records = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record['label'] == label and record['host'] == host:
+                    key = history_key(record['command'], record['parallel'], record['rate'])
+                    records[key] = record
+            except (ValueError, KeyError, TypeError):
+                continue
+    return records
+
+
+def save_history(path: str, results: List[BenchmarkResult], label: str, host: str) -> None:
+    """
+    Append one JSON line per result to the history file.
+
+    Raises:
+        OSError: If the history file cannot be written
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    with open(path, 'a') as f:
+        for result in results:
+            record = {
+                'timestamp': timestamp,
+                'label': label,
+                'host': host,
+                'hostname': platform.node(),
+                'command': result.command,
+                'parameters': result.params,
+                'parallel': result.parallel,
+                'rate': result.rate,
+                'iterations': result.count,
+                'statistics': result.get_statistics(),
+                'times': result.times,
+            }
+            f.write(json.dumps(record) + '\n')
+
+
+def check_baseline(result: BenchmarkResult, record: Dict[str, Any], alpha: float,
+                   max_slowdown: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Compare a result against a stored run.
+
+    A result counts as a regression only if it is significantly slower and,
+    when max_slowdown (percent) is given, its median grew by more than that.
+    """
+    check = {
+        'label': record['label'],
+        'timestamp': record.get('timestamp'),
+        'baseline_median': statistics.median(record['times']),
+        'median': statistics.median(result.times),
+    }
+    check.update(compare_samples(result.times, record['times'], alpha))
+    slowdown = (check['ratio'] - 1) * 100 if 'ratio' in check else 0.0
+    check['regression'] = (max_slowdown is not None and check['verdict'] == 'slower'
+                           and slowdown > max_slowdown)
+    return check
+
+
+def needs_shell(command: str) -> bool:
+    """Return True if a command uses shell syntax and cannot be exec'd directly."""
+    if SHELL_METACHARACTERS & set(command):
+        return True
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return True
+    return not argv or argv[0] in SHELL_BUILTINS or '=' in argv[0]
+
+
+def run_command(
+    command: str,
+    shell: Optional[bool] = None,
+    timeout: Optional[int] = None,
+    output: str = 'tail',
+    tail_bytes: int = STDERR_TAIL_BYTES,
+    spawner: Optional[Executor] = None
+) -> tuple[float, bool, str, Optional[Dict[str, float]]]:
     """
     Run a command and measure its execution time.
 
+    Args:
+        command: Command line to run
+        shell: Run through /bin/sh (True), exec directly (False), or decide
+               with needs_shell() (None)
+        timeout: Seconds before the command is killed
+        output: Output policy (see OUTPUT_POLICIES)
+        tail_bytes: Bytes of stderr kept for the error message ('tail' and
+                    'count' policies)
+        spawner: Single-thread executor to start the command from, so that it
+                 inherits that thread's CPU affinity and nice value
+
     Returns:
-        Tuple of (elapsed_time, success, output/error)
+        Tuple of (elapsed_time, success, output/error, resource usage); the
+        usage is None where wait4() is not available, leaves out
+        'max_rss_kb' when it cannot be told apart from this process's own
+        (see _run_spawn()), and includes 'output_bytes' with the 'count'
+        policy
     """
-    start_time = time.time()
+    if shell is None:
+        shell = needs_shell(command)
+    argv = ['/bin/sh', '-c', command] if shell else shlex.split(command)
+
+    if hasattr(os, 'posix_spawnp') and hasattr(os, 'wait4'):
+        return _run_spawn(argv, timeout, output, tail_bytes, spawner)
+    return _run_subprocess(command if shell else argv, shell, timeout, output, tail_bytes)
+
+
+def drop_page_caches() -> None:
+    """
+    Flush dirty pages and drop the OS page cache.
+
+    Raises:
+        OSError: If the cache cannot be dropped (not root, unsupported OS)
+    """
+    os.sync()
+    if sys.platform == 'darwin':
+        if subprocess.run(['purge']).returncode != 0:
+            raise OSError("purge failed")
+    elif os.path.exists(DROP_CACHES_PATH):
+        with open(DROP_CACHES_PATH, 'w') as f:
+            f.write('3\n')
+    else:
+        raise OSError(f"dropping page caches is not supported on {sys.platform}")
+
+
+def _count_bytes(fd: int, counter: List[int]) -> None:
+    """Drain a pipe into a reused buffer, adding the bytes read to counter[0]."""
+    buffer = bytearray(PIPE_CHUNK_SIZE)
+    with open(fd, 'rb', buffering=0) as pipe:
+        while True:
+            n = pipe.readinto(buffer)
+            if not n:
+                break
+            counter[0] += n
+
+
+def _run_spawn(argv: List[str], timeout: Optional[int], output: str = 'tail',
+               tail_bytes: int = STDERR_TAIL_BYTES,
+               spawner: Optional[Executor] = None) -> tuple[float, bool, str, Optional[Dict[str, float]]]:
+    """
+    Run argv with posix_spawn and reap it with wait4() for its rusage.
+
+    With a spawner, posix_spawn is called on its thread and the child
+    inherits that thread's CPU affinity and nice value; waiting happens here.
+
+    On Linux a child's max RSS never reads below this process's own RSS at
+    spawn time, because the kernel carries the pre-exec high-water mark over.
+    'max_rss_kb' is therefore only reported when it exceeds this process's
+    peak RSS, which means it is the command's own.
+    """
+    file_actions = [(os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0)]
+    stderr = None
+    if output == 'discard' or not tail_bytes:
+        file_actions.append((os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0))
+    else:
+        # A file rather than a pipe: the child never blocks on a full pipe and
+        # only the last tail_bytes are ever read back
+        stderr = tempfile.TemporaryFile()
+        file_actions.append((os.POSIX_SPAWN_DUP2, stderr.fileno(), 2))
+
+    counted = [0]
+    reader = None
+    if output == 'count':
+        read_fd, write_fd = os.pipe()
+        file_actions[0] = (os.POSIX_SPAWN_DUP2, write_fd, 1)
+        reader = threading.Thread(target=_count_bytes, args=(read_fd, counted), daemon=True)
+        reader.start()
+
+    def spawn() -> Tuple[int, Any]:
+        start_time = time.perf_counter_ns()
+        try:
+            return start_time, os.posix_spawnp(argv[0], argv, os.environ,
+                                               file_actions=file_actions)
+        except OSError as e:
+            return start_time, e
+
+    try:
+        timed_out = threading.Event()
+
+        try:
+            start_time, pid = spawner.submit(spawn).result() if spawner else spawn()
+        finally:
+            if reader:
+                os.close(write_fd)
+        if isinstance(pid, OSError):
+            elapsed = (time.perf_counter_ns() - start_time) / 1e9
+            return (elapsed, False, f"{argv[0]}: {pid.strerror}", None)
+
+        # The kill timer may fire just as the child exits. Waiting with
+        # WNOWAIT leaves the child a zombie, so its PID cannot be reused,
+        # until `reaped` is set under the lock the timer checks before killing
+        # (without waitid() only the ProcessLookupError is avoided)
+        timer = None
+        reap_lock = threading.Lock()
+        reaped = False
+        if timeout:
+            def kill() -> None:
+                with reap_lock:
+                    if reaped:
+                        return
+                    timed_out.set()
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+
+        if timer and hasattr(os, 'waitid'):
+            os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+            with reap_lock:
+                _, status, rusage = os.wait4(pid, 0)
+                reaped = True
+        else:
+            _, status, rusage = os.wait4(pid, 0)
+            with reap_lock:
+                reaped = True
+        elapsed = (time.perf_counter_ns() - start_time) / 1e9
+        if timer:
+            timer.cancel()
+
+        usage = {
+            'user_time': rusage.ru_utime,
+            'system_time': rusage.ru_stime,
+            'voluntary_switches': rusage.ru_nvcsw,
+            'involuntary_switches': rusage.ru_nivcsw,
+            'minor_faults': rusage.ru_minflt,
+            'major_faults': rusage.ru_majflt,
+        }
+        max_rss_kb = rusage.ru_maxrss
+        own_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+        if sys.platform == 'darwin':
+            max_rss_kb //= 1024   # bytes on macOS
+            own_rss_kb //= 1024
+        if max_rss_kb > own_rss_kb:
+            usage['max_rss_kb'] = max_rss_kb
+        if reader:
+            reader.join()
+            usage['output_bytes'] = counted[0]
+
+        if (timed_out.is_set() and os.WIFSIGNALED(status)
+                and os.WTERMSIG(status) == signal.SIGKILL):
+            return (elapsed, False, f"Command timed out after {timeout} seconds", usage)
+
+        exit_code = os.waitstatus_to_exitcode(status)
+        if exit_code == 0:
+            return (elapsed, True, '', usage)
+
+        message = ''
+        if stderr:
+            stderr.seek(max(0, os.fstat(stderr.fileno()).st_size - tail_bytes))
+            message = stderr.read().decode(errors='replace').strip()
+        if not message:
+            message = (f"Killed by signal {-exit_code}" if exit_code < 0
+                       else f"Exit status {exit_code}")
+        return (elapsed, False, message, usage)
+    finally:
+        if stderr:
+            stderr.close()
+
+
+def _run_subprocess(command, shell: bool, timeout: Optional[int], output: str = 'tail',
+                    tail_bytes: int = STDERR_TAIL_BYTES) -> tuple[float, bool, str, Optional[Dict[str, float]]]:
+    """
+    Run a command with subprocess where posix_spawn/wait4 are unavailable.
+
+    The 'count' policy buffers stdout in memory here to measure it.
+    """
+    keep_stderr = output != 'discard' and tail_bytes
+    start_time = time.perf_counter_ns()
 
     try:
         result = subprocess.run(
             command,
             shell=shell,
-            capture_output=True,
-            text=True,
+            stdout=subprocess.PIPE if output == 'count' else subprocess.DEVNULL,
+            stderr=subprocess.PIPE if keep_stderr else subprocess.DEVNULL,
             timeout=timeout,
             check=True
         )
-        elapsed = time.time() - start_time
-        return (elapsed, True, result.stdout)
+        elapsed = (time.perf_counter_ns() - start_time) / 1e9
+        usage = {'output_bytes': len(result.stdout)} if output == 'count' else None
+        return (elapsed, True, '', usage)
 
     except subprocess.CalledProcessError as e:
-        elapsed = time.time() - start_time
-        return (elapsed, False, e.stderr or str(e))
+        elapsed = (time.perf_counter_ns() - start_time) / 1e9
+        stderr = e.stderr[-tail_bytes:].decode(errors='replace').strip() if e.stderr else ''
+        return (elapsed, False, stderr or str(e), None)
 
     except subprocess.TimeoutExpired:
-        elapsed = time.time() - start_time
-        return (elapsed, False, f"Command timed out after {timeout} seconds")
+        elapsed = (time.perf_counter_ns() - start_time) / 1e9
+        return (elapsed, False, f"Command timed out after {timeout} seconds", None)
 
     except Exception as e:
-        elapsed = time.time() - start_time
-        return (elapsed, False, str(e))
+        elapsed = (time.perf_counter_ns() - start_time) / 1e9
+        return (elapsed, False, str(e), None)
 
 
 def benchmark_command(
@@ -103,7 +1148,21 @@ def benchmark_command(
     iterations: int = 1,
     warmup: int = 0,
     timeout: Optional[int] = None,
-    verbose: bool = False
+    verbose: bool = False,
+    shell: Optional[bool] = None,
+    parallel: int = 1,
+    rate: Optional[float] = None,
+    precision: Optional[float] = None,
+    max_time: float = DEFAULT_MAX_TIME,
+    precision_stat: str = 'mean',
+    output: str = 'tail',
+    tail_bytes: int = STDERR_TAIL_BYTES,
+    keep_samples: bool = True,
+    prepare: Optional[str] = None,
+    cleanup: Optional[str] = None,
+    cold: bool = False,
+    calibrate: bool = False,
+    spawner: Optional[Executor] = None
 ) -> BenchmarkResult:
     """
     Benchmark a command over multiple iterations.
@@ -114,62 +1173,344 @@ def benchmark_command(
         warmup: Number of warmup runs (not counted)
         timeout: Command timeout in seconds
         verbose: Show detailed output
+        shell: Run through /bin/sh (True), exec directly (False), or decide
+               per command (None)
+        parallel: Iterations run at once (closed loop); with `rate`, the
+                  maximum number in flight
+        rate: Start iterations at this many per second (open loop)
+        precision: Keep running until the 95% CI of `precision_stat` is
+                   within ±precision (a fraction, e.g. 0.01) of it;
+                   `iterations` is then the minimum count
+        max_time: Seconds of measurement after which --precision gives up
+        precision_stat: 'mean' or 'median'
+        output: Output policy (see OUTPUT_POLICIES)
+        tail_bytes: Bytes of stderr kept for error messages
+        keep_samples: Store per-iteration samples; False keeps only
+                      running statistics, in constant memory
+        prepare: Command run before every iteration, untimed
+        cleanup: Command run after every iteration, untimed
+        cold: Drop the page cache before every iteration
+        calibrate: Time a no-op over the same spawn path just before every
+                   iteration, into result.calibration
+        spawner: Single-thread executor the command and the calibration
+                 no-ops are started from (see run_command()); hooks are
+                 started without it
 
     Returns:
         BenchmarkResult with timing data
+
+    Raises:
+        RuntimeError: If a --prepare or --cleanup command fails
+        OSError: If the page cache cannot be dropped
     """
-    result = BenchmarkResult(command, iterations)
+    result = BenchmarkResult(command, iterations, parallel, rate, keep_samples)
+    if shell is None:
+        shell = needs_shell(command)
+    run = functools.partial(run_command, command, shell=shell, timeout=timeout,
+                            output=output, tail_bytes=tail_bytes, spawner=spawner)
+
+    if calibrate:
+        noop = functools.partial(run_command, CALIBRATION_COMMANDS[shell], shell=shell,
+                                 timeout=timeout, output=output, tail_bytes=tail_bytes,
+                                 spawner=spawner)
+        run = functools.partial(_run_calibrated, run, noop, result.calibration)
+
+    if prepare or cleanup or cold:
+        result.hooks = {'prepare': prepare, 'cleanup': cleanup, 'cold': cold}
+        run = functools.partial(_run_with_hooks, run, prepare, cleanup, cold, timeout)
 
     # Warmup runs
     if warmup > 0 and verbose:
         print(f"  Warmup: {warmup} iteration(s)...", end='', flush=True)
 
     for _ in range(warmup):
-        run_command(command, timeout=timeout)
+        run()
+    result.calibration.clear()
 
     if warmup > 0 and verbose:
         print(" done")
 
+    def record(elapsed: float, success: bool, message: str,
+               usage: Optional[Dict[str, float]]) -> None:
+        result.add_time(elapsed, success, usage)
+        if verbose and (rate or parallel > 1):
+            print(f"  Iteration {result.count}/{iterations}: {result.format_time(elapsed)}")
+        if verbose and not success:
+            print(f"  Error: {message}")
+
     # Actual benchmark runs
-    for i in range(iterations):
-        if verbose and iterations > 1:
-            print(f"  Iteration {i + 1}/{iterations}...", end='', flush=True)
+    start_time = time.perf_counter()
+    if rate:
+        _run_open_loop(run, iterations, rate, parallel if parallel > 1 else OPEN_LOOP_WORKERS,
+                       record, result.add_lag)
+    elif parallel > 1:
+        _run_closed_loop(run, iterations, parallel, record)
+    elif precision:
+        _run_until_precise(result, run, max(iterations, MIN_ADAPTIVE_ITERATIONS), precision,
+                           max_time, precision_stat, verbose)
+    else:
+        for i in range(iterations):
+            if verbose and iterations > 1:
+                print(f"  Iteration {i + 1}/{iterations}...", end='', flush=True)
+
+            elapsed, success, message, usage = run()
+            result.add_time(elapsed, success, usage)
+
+            if verbose:
+                if iterations > 1:
+                    print(f" {result.format_time(elapsed)}")
+                if not success:
+                    print(f"  Error: {message}")
+    result.wall_time = time.perf_counter() - start_time
+
+    return result
+
+
+def _run_calibrated(run: Callable, noop: Callable, samples: List[float]) -> tuple:
+    """Time the no-op into samples, then run the iteration; pairs share conditions."""
+    samples.append(noop()[0])
+    return run()
+
+
+def _run_with_hooks(run: Callable, prepare: Optional[str], cleanup: Optional[str],
+                    cold: bool, timeout: Optional[int]) -> tuple:
+    """Run one iteration between its prepare and cleanup hooks; only `run` is timed."""
+    if prepare:
+        _, success, message, _ = run_command(prepare, timeout=timeout)
+        if not success:
+            raise RuntimeError(f"--prepare command failed: {message}")
+    if cold:
+        drop_page_caches()
 
-        elapsed, success, output = run_command(command, timeout=timeout)
-        result.add_time(elapsed, success)
+    outcome = run()
+
+    if cleanup:
+        _, success, message, _ = run_command(cleanup, timeout=timeout)
+        if not success:
+            raise RuntimeError(f"--cleanup command failed: {message}")
+    return outcome
+
+
+def _run_until_precise(result: BenchmarkResult, run: Callable, min_iterations: int,
+                       precision: float, max_time: float, statistic: str,
+                       verbose: bool) -> None:
+    """
+    Run iterations until the confidence interval is narrow enough or time runs out.
+
+    The interval (and, when verbose, the outlier count) is rechecked whenever
+    the sample has grown by PRECISION_CHECK_GROWTH, so long runs of fast
+    commands do not re-sort the sample after every iteration. Records the
+    outcome in result.precision.
+    """
+    deadline = time.perf_counter() + max_time
+    next_check = min_iterations
+    achieved = None
+    reached = False
+
+    while True:
+        elapsed, success, message, usage = run()
+        result.add_time(elapsed, success, usage)
+        n = result.count
 
         if verbose:
-            if iterations > 1:
-                print(f" {result.format_time(elapsed)}")
+            print(f"  Iteration {n}: {result.format_time(elapsed)}")
             if not success:
-                print(f"  Error: {output}")
+                print(f"  Error: {message}")
+
+        if n >= next_check:
+            achieved = result.get_relative_precision(statistic)
+            if verbose and achieved is not None:
+                outliers = (f", {len(find_outliers(result.times))} outlier(s)"
+                            if result.keep_samples else '')
+                print(f"  Precision after {n} iterations: ±{achieved * 100:.2f}%{outliers}")
+            if achieved is not None and achieved <= precision:
+                reached = True
+                break
+            next_check = max(n + 1, int(n * PRECISION_CHECK_GROWTH))
+
+        if time.perf_counter() >= deadline:
+            achieved = result.get_relative_precision(statistic)
+            break
+
+    result.iterations = result.count
+    interval = result.get_confidence_interval(statistic)
+    result.precision = {
+        'statistic': statistic,
+        'target': precision,
+        'achieved': achieved,
+        'reached': reached,
+        'confidence_interval': list(interval) if interval else None,
+    }
+
+
+def _run_closed_loop(run: Callable, iterations: int, parallel: int, record: Callable) -> None:
+    """
+    Run iterations on `parallel` workers, each starting a new run when its last one ends.
 
-    return result
+    At most `parallel` runs are submitted at a time and each is recorded as
+    soon as it completes, so memory does not grow with the iteration count.
+    """
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        pending = set()
+        submitted = 0
+        while submitted < iterations or pending:
+            while submitted < iterations and len(pending) < parallel:
+                pending.add(executor.submit(run))
+                submitted += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(*future.result())
+
+
+def _run_open_loop(run: Callable, iterations: int, rate: float, workers: int,
+                   record: Callable, record_lag: Callable[[float], None]) -> None:
+    """
+    Start iterations at fixed arrival times, `rate` per second.
+
+    Each run's latency is measured from its scheduled start, so time spent
+    waiting for a free worker is included instead of silently lowering the
+    offered load (coordinated omission). The wait itself is passed to
+    `record_lag`. Completed runs are recorded before every arrival, also
+    when the schedule has fallen behind, so only runs still in flight or
+    queued are held in memory.
+    """
+    def timed_run(scheduled: float) -> tuple:
+        lag = max(0.0, time.perf_counter() - scheduled)
+        elapsed, success, message, usage = run()
+        return lag, (lag + elapsed, success, message, usage)
+
+    def collect(done: set) -> None:
+        for future in done:
+            lag, sample = future.result()
+            record_lag(lag)
+            record(*sample)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        start_time = time.perf_counter()
+        for i in range(iterations):
+            scheduled = start_time + i / rate
+            delay = scheduled - time.perf_counter()
+            while delay > 0:
+                if pending:
+                    done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+                    collect(done)
+                else:
+                    time.sleep(delay)
+                delay = scheduled - time.perf_counter()
+            if pending:
+                done, pending = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(timed_run, scheduled))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+
+def format_histogram(result: BenchmarkResult, rows: int = HISTOGRAM_ROWS,
+                     width: int = HISTOGRAM_BAR_WIDTH) -> List[str]:
+    """Draw a result's latency histogram as ASCII bars, one log-spaced bin per line."""
+    bins = result.histogram.bins(rows)
+    peak = max((count for _, _, count in bins), default=0)
+    lines = []
+    for low, high, count in bins:
+        bar = '#' * math.ceil(count / peak * width) if count else ''
+        lines.append(f"  {result.format_time(low):>10} - {result.format_time(high):>10} "
+                     f"|{bar:<{width}} {count}")
+    return lines
 
 
-def format_text_output(results: List[BenchmarkResult], compare: bool = False) -> str:
-    """Format benchmark results as text."""
+def format_text_output(results: List[BenchmarkResult], compare: bool = False,
+                       alpha: float = DEFAULT_ALPHA, histogram: bool = False) -> str:
+    """Format benchmark results as text, with ASCII latency histograms if requested."""
     lines = []
+    load_sweep = any(r.rate or r.parallel > 1 for r in results)
+    param_names = list(dict.fromkeys(name for r in results for name in r.params))
+
+    if len(results) > 1 and (load_sweep or param_names) and not compare:
+        lines.append("Parameter Scan" if param_names else "Load Sweep")
+        lines.append("=" * 70)
+        lines.append("")
+        widths = {name: max(len(name), *(len(r.params.get(name, '')) for r in results))
+                  for name in param_names}
+        columns = [f"{name:<{widths[name]}}" for name in param_names]
+        if load_sweep or not param_names:
+            columns.append(f"{'Load':<14}")
+        lines.append(f"{' '.join(columns)} {'Runs/s':>9} {'Mean':>11} {'p50':>11} {'p90':>11} "
+                     f"{'p99':>11} {'p99.9':>11} {'Fail':>5}")
+        command = None
+        for result in results:
+            stats = result.get_statistics()
+            if not stats:
+                continue
+            if result.template != command:
+                command = result.template
+                lines.append(f"Command: {command}")
+            cells = [f"{result.params.get(name, ''):<{widths[name]}}" for name in param_names]
+            if load_sweep or not param_names:
+                cells.append(f"{result.load_label():<14}")
+            throughput = f"{stats['throughput']:.2f}" if 'throughput' in stats else '-'
+            lines.append(f"{' '.join(cells)} {throughput:>9} "
+                         f"{result.format_time(stats['mean']):>11} "
+                         f"{result.format_time(stats['p50']):>11} "
+                         f"{result.format_time(stats['p90']):>11} "
+                         f"{result.format_time(stats['p99']):>11} "
+                         f"{result.format_time(stats['p99.9']):>11} {result.failure_count:>5}")
+        lines.append("")
+
+        overheads = {(r.overhead['median'], r.overhead['subtracted']) for r in results if r.overhead}
+        for median, subtracted in sorted(overheads):
+            action = 'subtracted from' if subtracted else 'included in'
+            lines.append(f"Note: spawn overhead of {results[0].format_time(median)} "
+                         f"{action} the times")
+        if overheads:
+            lines.append("")
 
-    if compare and len(results) > 1:
+    elif compare and len(results) > 1:
         lines.append("Benchmark Comparison")
         lines.append("=" * 70)
         lines.append("")
+        lines.append(f"Baseline: {results[0].command}")
+        lines.append("")
 
-        # Find fastest
-        fastest_mean = min(r.get_statistics().get('mean', float('inf')) for r in results)
+        comparisons = compare_results(results, alpha)
+        fastest_median = min(c.get('median', float('inf')) for c in comparisons)
 
-        for result in results:
+        for result, comparison in zip(results, comparisons):
             stats = result.get_statistics()
             if not stats:
                 continue
 
-            mean_time = stats['mean']
-            ratio = mean_time / fastest_mean if fastest_mean > 0 else 0
-
+            low, high = comparison['median_ci']
+            fastest = ' (fastest)' if comparison['median'] == fastest_median else ''
             lines.append(f"Command: {result.command}")
-            lines.append(f"  Mean:   {result.format_time(mean_time)}")
-            lines.append(f"  Ratio:  {ratio:.2f}x {'(fastest)' if ratio == 1.0 else ''}")
+            lines.append(f"  Median: {result.format_time(comparison['median'])} "
+                         f"[95% CI {result.format_time(low)} .. {result.format_time(high)}]{fastest}")
+            lines.append(f"  Mean:   {result.format_time(stats['mean'])}")
+            usage = result.get_usage_statistics()
+            if 'user_time' in usage:
+                cpu_time = usage['user_time'] + usage['system_time']
+                lines.append(f"  CPU:    {result.format_time(cpu_time)}")
+            if result.overhead:
+                action = 'subtracted' if result.overhead['subtracted'] else 'included'
+                lines.append(f"  Spawn:  {result.format_time(result.overhead['median'])} "
+                             f"overhead ({action})")
+
+            if 'verdict' in comparison:
+                if 'ratio' in comparison:
+                    low, high = comparison['ratio_ci']
+                    lines.append(f"  Ratio:  {comparison['ratio']:.2f}x "
+                                 f"[95% CI {low:.2f}x .. {high:.2f}x] vs baseline")
+                lines.append(f"  Result: {comparison['verdict']} "
+                             f"(Mann-Whitney U p = {comparison['p_value']:.3g})")
+            else:
+                lines.append("  Ratio:  1.00x (baseline)")
+            lines.append("")
+
+        if min(len(r.times) for r in results) < MIN_COMPARE_ITERATIONS:
+            lines.append(f"Note: fewer than {MIN_COMPARE_ITERATIONS} iterations per command; "
+                         "use -n for a meaningful significance test")
             lines.append("")
 
     else:
@@ -179,6 +1520,21 @@ def format_text_output(results: List[BenchmarkResult], compare: bool = False) ->
             lines.append("")
             lines.append(f"Command:    {result.command}")
             lines.append(f"Iterations: {result.iterations}")
+            if result.rate or result.parallel > 1:
+                lines.append(f"Load:       {result.load_label()}")
+            if result.overhead:
+                action = 'subtracted' if result.overhead['subtracted'] else 'included'
+                lines.append(f"Overhead:   {result.format_time(result.overhead['median'])} "
+                             f"spawn cost per run ({action})")
+            if result.hooks.get('cold'):
+                lines.append("Cache:      cold (page cache dropped before each run)")
+            if result.hooks.get('prepare'):
+                lines.append(f"Prepare:    {result.hooks['prepare']}")
+            if result.hooks.get('cleanup'):
+                lines.append(f"Cleanup:    {result.hooks['cleanup']}")
+            if result.merged_from:
+                sources = ', '.join(dict.fromkeys(result.merged_from))
+                lines.append(f"Merged:     {len(result.merged_from)} export(s) from {sources}")
             lines.append(f"Success:    {result.success_count}/{result.iterations}")
             lines.append("")
 
@@ -191,7 +1547,56 @@ def format_text_output(results: List[BenchmarkResult], compare: bool = False) ->
                 lines.append(f"  Median:     {result.format_time(stats['median'])}")
                 if stats['stdev'] > 0:
                     lines.append(f"  Std Dev:    {result.format_time(stats['stdev'])}")
+                if result.count > 1:
+                    lines.append(f"  p90 / p99:  {result.format_time(stats['p90'])} / "
+                                 f"{result.format_time(stats['p99'])}")
+                if result.count >= 1000:
+                    lines.append(f"  p99.9:      {result.format_time(stats['p99.9'])}")
                 lines.append(f"  Total:      {result.format_time(stats['total'])}")
+                if (result.rate or result.parallel > 1) and 'throughput' in stats:
+                    lines.append(f"  Throughput: {stats['throughput']:.2f} runs/s")
+                if result.lag_stats.count:
+                    lines.append(f"  Start Lag:  {result.format_time(result.lag_stats.mean)} mean, "
+                                 f"{result.format_time(result.lag_stats.max)} max")
+                if stats.get('outliers'):
+                    share = stats['outliers'] / result.count * 100
+                    lines.append(f"  Outliers:   {stats['outliers']} ({share:.1f}%)")
+
+            if result.precision:
+                info = result.precision
+                achieved = (f"±{info['achieved'] * 100:.2f}%" if info['achieved'] is not None
+                            else 'unknown')
+                status = 'reached' if info['reached'] else 'not reached within --max-time'
+                lines.append("")
+                lines.append(f"Precision:    {achieved} (95% CI of {info['statistic']}), "
+                             f"target ±{info['target'] * 100:g}% {status}")
+                if info['confidence_interval']:
+                    low, high = info['confidence_interval']
+                    lines.append(f"  95% CI:     {result.format_time(low)} .. "
+                                 f"{result.format_time(high)}")
+
+            if histogram and result.histogram.count:
+                lines.append("")
+                lines.append("Latency Histogram:")
+                lines.extend(format_histogram(result))
+
+            usage = result.get_usage_statistics()
+            if usage:
+                lines.append("")
+                lines.append("Resource Usage (mean per iteration):")
+            if 'user_time' in usage:
+                lines.append(f"  User CPU:   {result.format_time(usage['user_time'])}")
+                lines.append(f"  System CPU: {result.format_time(usage['system_time'])}")
+                if 'max_rss_kb' in usage:
+                    lines.append(f"  Max RSS:    {usage['max_rss_kb'] / 1024:.1f} MB (peak)")
+                else:
+                    lines.append("  Max RSS:    n/a (not above the timer's own)")
+                lines.append(f"  Ctx Switch: {usage['voluntary_switches']:.1f} voluntary, "
+                             f"{usage['involuntary_switches']:.1f} involuntary")
+                lines.append(f"  Page Flts:  {usage['minor_faults']:.1f} minor, "
+                             f"{usage['major_faults']:.1f} major")
+            if 'output_bytes' in usage:
+                lines.append(f"  Output:     {usage['output_bytes'] / 1024:.1f} KB on stdout")
 
             if result.failure_count > 0:
                 lines.append("")
@@ -199,46 +1604,205 @@ def format_text_output(results: List[BenchmarkResult], compare: bool = False) ->
 
             lines.append("")
 
+    checked = [result for result in results if result.baseline]
+    if checked:
+        lines.append(f"Baseline Check: {checked[0].baseline['label']}")
+        lines.append("=" * 70)
+        lines.append("")
+        for result in checked:
+            check = result.baseline
+            ratio = f"{check['ratio']:.2f}x" if 'ratio' in check else 'n/a'
+            lines.append(f"Command: {result.command}")
+            lines.append(f"  Median: {result.format_time(check['baseline_median'])} "
+                         f"({check['timestamp']}) -> {result.format_time(check['median'])}, "
+                         f"{ratio}")
+            verdict = 'REGRESSION' if check['regression'] else check['verdict']
+            lines.append(f"  Result: {verdict} (Mann-Whitney U p = {check['p_value']:.3g})")
+            lines.append("")
+
     return "\n".join(lines)
 
 
-def format_json_output(results: List[BenchmarkResult]) -> str:
-    """Format benchmark results as JSON."""
+def format_json_output(results: List[BenchmarkResult], compare: bool = False,
+                       alpha: float = DEFAULT_ALPHA) -> str:
+    """Format benchmark results as JSON, with the --compare analysis if requested."""
     output = []
+    comparisons = compare_results(results, alpha) if compare and len(results) > 1 else None
 
-    for result in results:
+    for i, result in enumerate(results):
         stats = result.get_statistics()
 
         data = {
             'command': result.command,
             'iterations': result.iterations,
+            'parallel': result.parallel,
+            'rate': result.rate,
+            'wall_time': result.wall_time,
             'success_count': result.success_count,
             'failure_count': result.failure_count,
-            'times': result.times,
             'statistics': stats
         }
+        if result.params:
+            data['template'] = result.template
+            data['parameters'] = result.params
+        if result.keep_samples:
+            data['times'] = result.times
+        if result.lags:
+            data['start_lags'] = result.lags
+        if result.lag_stats.count:
+            data['start_lag_statistics'] = {'mean': result.lag_stats.mean,
+                                            'max': result.lag_stats.max}
+        if result.precision:
+            data['precision'] = result.precision
+        if any(result.usage):
+            data['rusage'] = result.usage
+        if result.usage_count:
+            data['rusage_statistics'] = result.get_usage_statistics()
+        if comparisons:
+            data['comparison'] = comparisons[i]
+        if result.baseline:
+            data['baseline'] = result.baseline
+        if result.hooks:
+            data['hooks'] = result.hooks
+        if result.overhead:
+            data['overhead'] = result.overhead
+        if result.merged_from:
+            data['merged_from'] = result.merged_from
+        if result.environment:
+            data['environment'] = result.environment
+        if not result.keep_samples:
+            data['histogram'] = result.histogram.to_dict()
 
         output.append(data)
 
     return json.dumps(output if len(output) > 1 else output[0], indent=2)
 
 
-def format_csv_output(results: List[BenchmarkResult]) -> str:
-    """Format benchmark results as CSV."""
+def format_csv_output(results: List[BenchmarkResult], summary: bool = False) -> str:
+    """
+    Format benchmark results as CSV.
+
+    One row per iteration, or with `summary` one row of summary statistics
+    and percentiles per result; summary rows are always used when
+    per-iteration samples were not kept.
+    """
     lines = []
+    param_names = list(dict.fromkeys(name for r in results for name in r.params))
+
+    if summary or not all(result.keep_samples for result in results):
+        columns = ['count', 'min', 'mean', 'stdev', 'max'] + [f'p{pct:g}' for pct in PERCENTILES]
+        lines.append("command," + "".join(f"{name}," for name in param_names)
+                     + ",".join(columns) + ",failures,parallel,rate")
+        for result in results:
+            stats = result.get_statistics()
+            if not stats:
+                continue
+            params = "".join(f'"{result.params.get(name, "")}",' for name in param_names)
+            values = [str(result.count)] + [f"{stats[column]:.6f}" for column in columns[1:]]
+            lines.append(f'"{result.command}",{params}' + ",".join(values)
+                         + f",{result.failure_count},{result.parallel},{result.rate or ''}")
+        return "\n".join(lines)
 
     # Header
-    lines.append("command,iteration,time_seconds,success")
+    fields = USAGE_FIELDS + ('output_bytes',)
+    lines.append("command," + "".join(f"{name}," for name in param_names)
+                 + "iteration,time_seconds,success," + ",".join(fields) + ",parallel,rate")
 
     # Data
     for result in results:
         for i, time_val in enumerate(result.times, 1):
-            success = "true" if i <= result.success_count else "false"
-            lines.append(f'"{result.command}",{i},{time_val:.6f},{success}')
+            success = "true" if result.successes[i - 1] else "false"
+            usage = result.usage[i - 1]
+            usage = usage or {}
+            columns = []
+            for field in fields:
+                if field not in usage:
+                    columns.append('')
+                elif field.endswith('_time'):
+                    columns.append(f"{usage[field]:.6f}")
+                else:
+                    columns.append(str(usage[field]))
+            params = "".join(f'"{result.params.get(name, "")}",' for name in param_names)
+            lines.append(f'"{result.command}",{params}{i},{time_val:.6f},{success},' + ",".join(columns)
+                         + f",{result.parallel},{result.rate or ''}")
 
     return "\n".join(lines)
 
 
+def expand_param_values(spec: str) -> List[str]:
+    """
+    Expand a parameter value list into individual values.
+
+    Items are comma-separated; each is a literal value or a numeric range
+    'START..END' (step 1), 'START..END:STEP' or 'START..END:xFACTOR'
+    (geometric), e.g. '1..8:x2' gives 1, 2, 4, 8.
+
+    Raises:
+        ValueError: If a range is malformed or empty
+    """
+    values = []
+    for item in spec.split(','):
+        item = item.strip()
+        match = re.fullmatch(r'(-?[\d.]+)\.\.(-?[\d.]+)(?::(x?)([\d.]+))?', item)
+        if not match:
+            if item:
+                values.append(item)
+            continue
+
+        start_text, end_text, geometric, step_text = match.groups()
+        is_int = all('.' not in text for text in (start_text, end_text, step_text or '1'))
+        kind = int if is_int else float
+        start, end, step = kind(start_text), kind(end_text), kind(step_text or 1)
+        if (geometric and step <= 1) or (not geometric and step <= 0) or start > end:
+            raise ValueError(f"Invalid parameter range: {item}")
+        if geometric and start <= 0:
+            raise ValueError(f"Geometric range must start above 0: {item}")
+
+        value = start
+        while value <= end + (0 if is_int else 1e-9):
+            values.append(str(value) if is_int else f"{value:g}")
+            value = value * step if geometric else value + step
+    if not values:
+        raise ValueError(f"No values in parameter list: {spec}")
+    return values
+
+
+def parse_param(spec: str) -> Tuple[str, List[str]]:
+    """Parse a --param 'NAME=VALUES' argument into its name and expanded values."""
+    name, sep, values = spec.partition('=')
+    name = name.strip()
+    if not sep or not re.fullmatch(r'\w+', name):
+        raise ValueError(f"Invalid --param '{spec}'; use NAME=VALUES (e.g. threads=1,2,4)")
+    return name, expand_param_values(values)
+
+
+def render_command(template: str, point: Dict[str, str]) -> str:
+    """Substitute {name} placeholders for the parameters in point, leaving other braces alone."""
+    if not point:
+        return template
+    pattern = re.compile(r'\{(' + '|'.join(re.escape(name) for name in point) + r')\}')
+    return pattern.sub(lambda match: point[match.group(1)], template)
+
+
+def parse_duration(value: str) -> float:
+    """Parse a duration such as '60', '60s', '500ms', '2m' or '1h' into seconds."""
+    value = value.strip().lower()
+    for suffix, scale in (('ms', 0.001), ('s', 1), ('m', 60), ('h', 3600)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+
+def parse_precision(value: str) -> float:
+    """Parse a precision target in percent ('1%' or '1') into a fraction."""
+    return float(value.strip().rstrip('%')) / 100
+
+
+def parse_levels(value: str, kind: Callable[[str], Any]) -> List[Any]:
+    """Parse a comma-separated list of load levels, e.g. '1,2,4,8'."""
+    return [kind(item) for item in value.split(',') if item.strip()]
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -249,18 +1813,44 @@ Examples:
   %(prog)s "ls -la"                         # Time a single command
   %(prog)s -n 10 "curl https://example.com" # Run 10 times
   %(prog)s --json "python script.py"        # JSON output
-  %(prog)s --compare "cmd1" "cmd2"          # Compare two commands
+  %(prog)s -n 30 --compare "cmd1" "cmd2"    # Is cmd2 faster than cmd1?
   %(prog)s -n 100 --warmup 5 "echo test"    # 5 warmup + 100 iterations
   %(prog)s --csv "ls" > results.csv         # Export to CSV
+  %(prog)s -n 1000 --csv-summary "ls" "ls -la"  # Percentiles as CSV
+  %(prog)s --shell -n 50 "true"             # Include /bin/sh startup
+  %(prog)s -n 200 --parallel 1,2,4,8 "curl -s localhost:8080"  # Concurrency sweep
+  %(prog)s -n 500 --rate 50 "./client ping" # Open loop, 50 starts/s
+  %(prog)s --precision 1%% --max-time 30s "make -s"  # Run until mean is ±1%%
+  %(prog)s -n 1000000 --streaming --output discard true  # Constant memory
+  %(prog)s -n 20 --output count "cat big.log"  # Record stdout size
+  %(prog)s -n 100000 --streaming --export-histograms web1.json "curl -s localhost"
+  %(prog)s --merge-histograms web1.json web2.json  # Combined percentiles
+  %(prog)s -n 5 --param buf=1M,16M,256M "sort -S {buf} big.txt"
+  %(prog)s -n 5 --param t=1..16:x2 --param n=1000..3000:1000 "./bench -t {t} -n {n}"
+  %(prog)s -n 200 --subtract-overhead "jq -n 1"  # Remove spawn cost
+  %(prog)s -n 5 --cold "tar cf /dev/null /srv/data"  # Cold page cache (root)
+  %(prog)s -n 5 --prepare "cp -r seed work" --cleanup "rm -rf work" "./migrate work"
+  %(prog)s -n 50 --cpus 2,3 --nice -10 "./hot-loop"  # Pinned, high priority
+  %(prog)s -n 30 --save v1.4 "./app --selftest"  # Record a baseline
+  %(prog)s -n 30 --baseline v1.4 --fail-if-slower 5 "./app --selftest"  # CI gate
         """
     )
 
     parser.add_argument(
         'commands',
-        nargs='+',
+        nargs='*',
         help='Command(s) to benchmark'
     )
 
+    parser.add_argument(
+        '--param',
+        action='append',
+        default=[],
+        metavar='NAME=VALUES',
+        help='Substitute {NAME} in the commands with each value: a comma-separated '
+             'list and/or numeric ranges START..END[:STEP|:xFACTOR]; repeat for a matrix'
+    )
+
     parser.add_argument(
         '-n', '--iterations',
         type=int,
@@ -275,6 +1865,119 @@ Examples:
         help='Number of warmup runs (default: 0)'
     )
 
+    parser.add_argument(
+        '--precision',
+        default=None,
+        metavar='PCT',
+        help='Keep running until the 95%% confidence interval is within ±PCT%% '
+             '(e.g. 1%%); -n becomes the minimum number of iterations'
+    )
+
+    parser.add_argument(
+        '--precision-stat',
+        choices=['mean', 'median'],
+        default='mean',
+        help='Statistic whose confidence interval --precision targets (default: mean)'
+    )
+
+    parser.add_argument(
+        '--max-time',
+        default=None,
+        metavar='DURATION',
+        help=f'Time budget for --precision, e.g. 60s or 2m (default: {DEFAULT_MAX_TIME:.0f}s)'
+    )
+
+    parser.add_argument(
+        '--output',
+        choices=OUTPUT_POLICIES,
+        default='tail',
+        help="What to do with the command's output: discard both streams, keep "
+             "the tail of stderr for error messages, or count stdout bytes "
+             "(default: tail)"
+    )
+
+    parser.add_argument(
+        '--tail-kb',
+        type=int,
+        default=STDERR_TAIL_BYTES // 1024,
+        help=f'KB of stderr kept for error messages (default: {STDERR_TAIL_BYTES // 1024})'
+    )
+
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='Keep only running statistics and the latency histogram (constant '
+             'memory); CSV output then has one row of percentiles per command'
+    )
+
+    parser.add_argument(
+        '--export-histograms',
+        default=None,
+        metavar='FILE',
+        help='Write each command\'s latency histogram to FILE for --merge-histograms'
+    )
+
+    parser.add_argument(
+        '--merge-histograms',
+        nargs='+',
+        default=None,
+        metavar='FILE',
+        help='Report on histograms exported from several runs or machines '
+             'instead of running commands'
+    )
+
+    parser.add_argument(
+        '--calibrate',
+        action='store_true',
+        help='Time an empty command over the same spawn path before every '
+             'iteration and report that overhead (not with --rate)'
+    )
+
+    parser.add_argument(
+        '--subtract-overhead',
+        action='store_true',
+        help='Calibrate as --calibrate does and subtract the median overhead '
+             'from every sample'
+    )
+
+    parser.add_argument(
+        '--cpus',
+        default=None,
+        metavar='LIST',
+        help='Pin the commands (not the timer itself) to these CPUs, '
+             'e.g. 2 or 0,2 or 4-7 (Linux)'
+    )
+
+    parser.add_argument(
+        '--nice',
+        type=int,
+        default=None,
+        metavar='N',
+        help='Run the commands at this nice value, -20 (highest priority) to 19; '
+             'negative values need root. On Linux only the commands are reniced, '
+             'elsewhere the whole timer'
+    )
+
+    parser.add_argument(
+        '--prepare',
+        default=None,
+        metavar='CMD',
+        help='Run CMD before every iteration, outside the timed region'
+    )
+
+    parser.add_argument(
+        '--cleanup',
+        default=None,
+        metavar='CMD',
+        help='Run CMD after every iteration, outside the timed region'
+    )
+
+    parser.add_argument(
+        '--cold',
+        action='store_true',
+        help='Drop the page cache before every iteration (requires root)'
+    )
+
     parser.add_argument(
         '--timeout',
         type=int,
@@ -282,10 +1985,80 @@ Examples:
         help='Command timeout in seconds (default: none)'
     )
 
+    parser.add_argument(
+        '--shell',
+        action='store_true',
+        help='Always run commands through /bin/sh (default: only when they need it)'
+    )
+
+    parser.add_argument(
+        '--parallel',
+        default='1',
+        metavar='N[,N...]',
+        help='Run N iterations at a time (closed loop); a comma-separated list '
+             'sweeps over each N. With --rate, the maximum runs in flight '
+             f'(default: 1, or {OPEN_LOOP_WORKERS} with --rate)'
+    )
+
+    parser.add_argument(
+        '--rate',
+        default=None,
+        metavar='R[,R...]',
+        help='Start iterations at R per second (open loop) and measure latency '
+             'from the scheduled start; a comma-separated list sweeps over each R'
+    )
+
     parser.add_argument(
         '--compare',
         action='store_true',
-        help='Compare multiple commands'
+        help='Compare commands against the first one, with confidence '
+             'intervals and a significance test'
+    )
+
+    parser.add_argument(
+        '--alpha',
+        type=float,
+        default=DEFAULT_ALPHA,
+        help=f'Significance level for --compare (default: {DEFAULT_ALPHA})'
+    )
+
+    parser.add_argument(
+        '--history',
+        default=DEFAULT_HISTORY,
+        metavar='FILE',
+        help='JSONL file that --save appends to and --baseline reads '
+             '(default: $TIMER_HISTORY or ~/.timer_history.jsonl)'
+    )
+
+    parser.add_argument(
+        '--host-key',
+        default=None,
+        metavar='NAME',
+        help='Key history runs by NAME instead of the hardware fingerprint, '
+             'e.g. to share baselines across a pool of CI runners'
+    )
+
+    parser.add_argument(
+        '--save',
+        default=None,
+        metavar='LABEL',
+        help='Append the results to the history under LABEL'
+    )
+
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        metavar='LABEL',
+        help='Compare each command against its latest run saved as LABEL on this host'
+    )
+
+    parser.add_argument(
+        '--fail-if-slower',
+        type=float,
+        default=None,
+        metavar='PCT',
+        help='With --baseline, exit non-zero if a command is significantly slower '
+             'and its median grew by more than PCT%%'
     )
 
     parser.add_argument(
@@ -300,6 +2073,13 @@ Examples:
         help='Output in CSV format'
     )
 
+    parser.add_argument(
+        '--csv-summary',
+        action='store_true',
+        help='Output one CSV row per command with count, min, mean, stdev, max '
+             'and p50/p90/p99/p99.9 instead of one row per iteration'
+    )
+
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -308,45 +2088,280 @@ Examples:
 
     args = parser.parse_args()
 
+    if args.merge_histograms:
+        if args.commands:
+            print("Error: --merge-histograms takes exported files instead of commands",
+                  file=sys.stderr)
+            return 1
+        try:
+            results = merge_histograms(args.merge_histograms)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot merge histograms: {e}", file=sys.stderr)
+            return 1
+        if not results:
+            print("Error: no histograms found", file=sys.stderr)
+            return 1
+
+        if args.json:
+            print(format_json_output(results))
+        elif args.csv or args.csv_summary:
+            print(format_csv_output(results, summary=True))
+        else:
+            print(format_text_output(results, histogram=args.verbose))
+        return 0
+
     # Validate arguments
+    if not args.commands:
+        print("Error: at least one command is required", file=sys.stderr)
+        return 1
+
     if args.iterations < 1:
         print("Error: iterations must be at least 1", file=sys.stderr)
         return 1
 
-    if args.compare and len(args.commands) < 2:
+    try:
+        parallel_levels = parse_levels(args.parallel, int)
+        rate_levels = parse_levels(args.rate, float) if args.rate else [None]
+    except ValueError:
+        print("Error: --parallel and --rate take numbers or comma-separated lists",
+              file=sys.stderr)
+        return 1
+
+    if not parallel_levels or any(n < 1 for n in parallel_levels):
+        print("Error: parallel must be at least 1", file=sys.stderr)
+        return 1
+
+    if not rate_levels or any(r is not None and r <= 0 for r in rate_levels):
+        print("Error: rate must be greater than 0", file=sys.stderr)
+        return 1
+
+    try:
+        precision = parse_precision(args.precision) if args.precision else None
+        max_time = parse_duration(args.max_time) if args.max_time else DEFAULT_MAX_TIME
+    except ValueError:
+        print("Error: invalid --precision or --max-time value", file=sys.stderr)
+        return 1
+
+    if precision is not None and precision <= 0:
+        print("Error: precision must be greater than 0", file=sys.stderr)
+        return 1
+
+    if max_time <= 0:
+        print("Error: max-time must be greater than 0", file=sys.stderr)
+        return 1
+
+    if args.max_time and precision is None:
+        print("Error: --max-time requires --precision", file=sys.stderr)
+        return 1
+
+    if precision is not None and (args.rate or parallel_levels != [1]):
+        print("Error: --precision cannot be combined with --parallel or --rate", file=sys.stderr)
+        return 1
+
+    if args.rate and len(parallel_levels) > 1:
+        print("Error: with --rate, --parallel takes a single worker limit", file=sys.stderr)
+        return 1
+
+    if not 0 < args.alpha < 1:
+        print("Error: alpha must be between 0 and 1", file=sys.stderr)
+        return 1
+
+    if args.tail_kb < 0:
+        print("Error: tail-kb cannot be negative", file=sys.stderr)
+        return 1
+
+    if args.streaming and (args.compare or args.precision_stat == 'median'
+                           or args.save or args.baseline or args.calibrate
+                           or args.subtract_overhead):
+        print("Error: --streaming cannot be combined with --compare, --save, --baseline, "
+              "--calibrate, --subtract-overhead or --precision-stat median",
+              file=sys.stderr)
+        return 1
+
+    if args.fail_if_slower is not None and not args.baseline:
+        print("Error: --fail-if-slower requires --baseline", file=sys.stderr)
+        return 1
+
+    if args.fail_if_slower is not None and args.fail_if_slower < 0:
+        print("Error: fail-if-slower cannot be negative", file=sys.stderr)
+        return 1
+
+    if (args.prepare or args.cleanup or args.cold) and (args.rate or parallel_levels != [1]):
+        print("Error: --prepare, --cleanup and --cold cannot be combined with "
+              "--parallel or --rate", file=sys.stderr)
+        return 1
+
+    if (args.calibrate or args.subtract_overhead) and args.rate:
+        print("Error: --calibrate and --subtract-overhead cannot be combined with --rate",
+              file=sys.stderr)
+        return 1
+
+    if args.cold and hasattr(os, 'geteuid') and os.geteuid() != 0:
+        print("Error: --cold must be run as root to drop the page cache", file=sys.stderr)
+        return 1
+
+    if args.cpus and not hasattr(os, 'sched_setaffinity'):
+        print("Error: --cpus is not supported on this platform", file=sys.stderr)
+        return 1
+
+    if args.nice is not None and not -20 <= args.nice <= 19:
+        print("Error: nice must be between -20 and 19", file=sys.stderr)
+        return 1
+
+    # The commands are started from one dedicated thread that carries --cpus
+    # and --nice: on Linux both are per-thread and inherited by children, so
+    # the timer's own threads and the hooks keep their defaults
+    spawner = None
+    if args.cpus or args.nice is not None:
+        spawner = ThreadPoolExecutor(max_workers=1)
+
+    if args.cpus:
+        try:
+            spawner.submit(os.sched_setaffinity, 0, parse_cpu_list(args.cpus)).result()
+        except (ValueError, OSError) as e:
+            print(f"Error: cannot pin to CPUs {args.cpus}: {e}", file=sys.stderr)
+            return 1
+
+    if args.nice is not None:
+        try:
+            spawner.submit(os.setpriority, os.PRIO_PROCESS, 0, args.nice).result()
+        except (AttributeError, OSError) as e:
+            print(f"Error: cannot set nice value {args.nice}: {e}", file=sys.stderr)
+            return 1
+
+    host = args.host_key or host_fingerprint()
+    stored = {}
+    if args.baseline:
+        try:
+            stored = load_history(args.history, args.baseline, host)
+        except OSError as e:
+            print(f"Error: cannot read history {args.history}: {e}", file=sys.stderr)
+            return 1
+        if not stored:
+            print(f"Error: no runs labelled '{args.baseline}' for host key {host} in "
+                  f"{args.history}", file=sys.stderr)
+            return 1
+
+    try:
+        params = dict(parse_param(spec) for spec in args.param)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    unused = [name for name in params
+              if not any(f'{{{name}}}' in command
+                         for command in args.commands + [args.prepare or '', args.cleanup or ''])]
+    if unused:
+        print(f"Error: parameter(s) not used in any command: {', '.join(unused)}",
+              file=sys.stderr)
+        return 1
+
+    if args.compare and len(args.commands) < 2 and not params:
         print("Error: compare mode requires at least 2 commands", file=sys.stderr)
         return 1
 
     # Run benchmarks
     results = []
+    warned = set()
 
-    for command in args.commands:
-        if args.verbose:
-            print(f"Benchmarking: {command}")
+    levels = [(parallel, rate) for rate in rate_levels for parallel in parallel_levels]
+    points = [dict(zip(params, values)) for values in itertools.product(*params.values())]
+    runs = [(template, point, level) for template in args.commands
+            for point in points for level in levels]
 
-        result = benchmark_command(
-            command,
-            iterations=args.iterations,
-            warmup=args.warmup,
-            timeout=args.timeout,
-            verbose=args.verbose
-        )
+    for template, point, (parallel, rate) in runs:
+        command = render_command(template, point)
+        if args.verbose:
+            load = f" ({format_load(parallel, rate)})" if len(levels) > 1 else ""
+            print(f"Benchmarking: {command}{load}")
+
+        environment = spawner.submit(get_environment).result() if spawner else get_environment()
+        environment['warnings'] = noise_warnings(environment)
+        for warning in environment['warnings']:
+            if warning not in warned:
+                warned.add(warning)
+                print(f"Warning: {warning}", file=sys.stderr)
+
+        try:
+            result = benchmark_command(
+                command,
+                iterations=args.iterations,
+                warmup=args.warmup,
+                timeout=args.timeout,
+                verbose=args.verbose,
+                shell=True if args.shell else None,
+                parallel=parallel,
+                rate=rate,
+                precision=precision,
+                max_time=max_time,
+                precision_stat=args.precision_stat,
+                output=args.output,
+                tail_bytes=args.tail_kb * 1024,
+                keep_samples=not args.streaming,
+                prepare=render_command(args.prepare, point) if args.prepare else None,
+                cleanup=render_command(args.cleanup, point) if args.cleanup else None,
+                cold=args.cold,
+                calibrate=args.calibrate or args.subtract_overhead,
+                spawner=spawner
+            )
+        except (RuntimeError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        result.template = template
+        result.params = point
+        result.environment = environment
         results.append(result)
 
-        if args.verbose and len(args.commands) > 1:
+        if result.calibration:
+            apply_overhead(result, result.calibration, args.subtract_overhead, args.alpha)
+            if result.overhead.get('indistinguishable'):
+                print(f"Warning: '{command}' is indistinguishable from the spawn overhead "
+                      f"(p = {result.overhead['p_value']:.3g}); its own run time is below "
+                      "the measurement noise", file=sys.stderr)
+
+        record = stored.get(history_key(command, parallel, rate))
+        if args.baseline and not record:
+            print(f"Warning: no '{args.baseline}' baseline for: {command}", file=sys.stderr)
+        elif record and record['times'] and result.times:
+            result.baseline = check_baseline(result, record, args.alpha, args.fail_if_slower)
+
+        if args.verbose and len(runs) > 1:
             print("")
 
     # Output results
     if args.json:
-        print(format_json_output(results))
-    elif args.csv:
-        print(format_csv_output(results))
+        print(format_json_output(results, compare=args.compare, alpha=args.alpha))
+    elif args.csv or args.csv_summary:
+        print(format_csv_output(results, summary=args.csv_summary))
     else:
-        print(format_text_output(results, compare=args.compare))
-
-    # Exit with error if any command failed
+        print(format_text_output(results, compare=args.compare, alpha=args.alpha,
+                                 histogram=args.verbose))
+
+    if args.export_histograms:
+        try:
+            export_histograms(args.export_histograms, results, host)
+        except OSError as e:
+            print(f"Error: cannot write histograms {args.export_histograms}: {e}",
+                  file=sys.stderr)
+            return 1
+
+    if args.save:
+        try:
+            save_history(args.history, results, args.save, host)
+        except OSError as e:
+            print(f"Error: cannot write history {args.history}: {e}", file=sys.stderr)
+            return 1
+
+    regressions = [r for r in results if r.baseline and r.baseline['regression']]
+    for result in regressions:
+        check = result.baseline
+        print(f"Regression: {result.command}: {result.format_time(check['baseline_median'])} -> "
+              f"{result.format_time(check['median'])} ({(check['ratio'] - 1) * 100:+.1f}%, "
+              f"p = {check['p_value']:.3g})", file=sys.stderr)
+
+    # Exit with error if any command failed or regressed
     total_failures = sum(r.failure_count for r in results)
-    return 1 if total_failures > 0 else 0
+    return 1 if total_failures > 0 or regressions else 0
 
 
 if __name__ == '__main__':
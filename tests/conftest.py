@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts live in python-scripts/, which is not an importable package name.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'python-scripts'))
@@ -0,0 +1,414 @@
+import errno
+import os
+import socket
+import threading
+
+import pytest
+import portcheck
+from portcheck import (AIMD_INITIAL, ENGINES, INITIAL_RTO, TOP_PORTS, UDP_NO_RESPONSE,
+                       ProbeTimeouts, ReorderBuffer, ResolverCache, ResultStore,
+                       ScanCheckpoint, ScanStopped, ScanThrottle, is_congestion, iter_probes,
+                       iter_targets, order_ports, parse_port_argument, probe_key, scan,
+                       scan_sharded, watch)
+
+
+@pytest.fixture
+def loopback_ports():
+    """An open (listening) and a closed (bound but refusing) TCP port on 127.0.0.1."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(64)
+    refusing = socket.socket()
+    refusing.bind(('127.0.0.1', 0))
+    yield listener.getsockname()[1], refusing.getsockname()[1]
+    listener.close()
+    refusing.close()
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_scan_against_loopback(engine, loopback_ports):
+    open_port, closed_port = loopback_ports
+    results = scan(iter_probes(['127.0.0.1'], [closed_port, open_port]), timeout=2,
+                   engine=engine)
+    states = {result['port']: (result['open'], result['error']) for result in results}
+    assert states == {open_port: (True, None), closed_port: (False, None)}
+    assert [result['port'] for result in results] == sorted(states)
+    assert all(result['address'] == '127.0.0.1' for result in results)
+    assert all(result['latency_ms'] is not None for result in results)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_scan_streams_to_on_result(engine, loopback_ports):
+    open_port, closed_port = loopback_ports
+    streamed = []
+    results = scan(iter_probes(['127.0.0.1'], [open_port, closed_port] * 20), timeout=2,
+                   workers=8, engine=engine, on_result=streamed.append)
+    assert results == []
+    assert len(streamed) == 40
+
+
+def test_scan_rejects_unknown_engine():
+    with pytest.raises(ValueError):
+        scan(iter([]), engine='fork')
+
+
+def test_iter_targets():
+    assert list(iter_targets(['a.example', '10.0.0.1, b.example'])) == \
+        ['a.example', '10.0.0.1', 'b.example']
+
+
+def test_iter_targets_cidr():
+    assert list(iter_targets(['192.0.2.0/30'])) == ['192.0.2.1', '192.0.2.2']
+    assert list(iter_targets(['192.0.2.7/32'])) == ['192.0.2.7']
+
+
+def test_iter_targets_is_lazy():
+    targets = iter_targets(['10.0.0.0/8'])
+    assert next(targets) == '10.0.0.1'
+
+
+def test_iter_targets_file(tmp_path):
+    hosts = tmp_path / 'hosts.txt'
+    hosts.write_text('# lab\nweb1\n\n198.51.100.0/31  # pair\n')
+    assert list(iter_targets([f'@{hosts}', 'db1'])) == \
+        ['web1', '198.51.100.0', '198.51.100.1', 'db1']
+
+
+@pytest.mark.parametrize('spec', ['10.0.0.0/33', '@/nonexistent/hosts.txt'])
+def test_iter_targets_rejects(spec):
+    with pytest.raises(ValueError):
+        list(iter_targets([spec]))
+
+
+def test_iter_probes_interleaves_hosts():
+    probes = iter_probes(['127.0.0.1', '127.0.0.2', '127.0.0.3'], [22, 80], block_size=2,
+                         resolver=ResolverCache())
+    assert [(host, port) for host, port, _ in probes] == [
+        ('127.0.0.1', 22), ('127.0.0.2', 22), ('127.0.0.1', 80), ('127.0.0.2', 80),
+        ('127.0.0.3', 22), ('127.0.0.3', 80)]
+
+
+def make_result(host, port, is_open=True, error=None, latency_ms=1.5, address=None):
+    return {'host': host, 'address': address or host, 'port': port, 'protocol': 'tcp',
+            'open': is_open, 'error': error, 'latency_ms': latency_ms}
+
+
+def test_reorder_buffer_restores_order_within_window():
+    emitted = []
+    buffer = ReorderBuffer(emitted.append, size=2)
+    for port in [3, 1, 2, 5, 4]:
+        buffer.push(make_result('h', port))
+    assert [result['port'] for result in emitted] == [1, 2, 3]
+    buffer.flush()
+    assert [result['port'] for result in emitted] == [1, 2, 3, 4, 5]
+
+
+def test_reorder_buffer_orders_hosts_within_port():
+    emitted = []
+    buffer = ReorderBuffer(emitted.append, size=10)
+    for host in ['10.0.0.10', '10.0.0.9']:
+        buffer.push(make_result(host, 22))
+    buffer.flush()
+    assert [result['host'] for result in emitted] == ['10.0.0.9', '10.0.0.10']
+
+
+def test_probe_timeouts_fixed():
+    timeouts = ProbeTimeouts(2.0)
+    timeouts.observe(make_result('h', 22, latency_ms=10))
+    assert timeouts.get('h') == timeouts.get('h', attempt=1) == 2.0
+    assert not timeouts.should_retry(make_result('h', 22, False, 'Connection timeout'), 0)
+
+
+def test_probe_timeouts_follow_rfc6298():
+    timeouts = ProbeTimeouts(5.0, adaptive=True, min_timeout=0.01)
+    assert timeouts.get('h') == INITIAL_RTO
+
+    # First sample: SRTT = R, RTTVAR = R / 2, RTO = SRTT + 4 * RTTVAR
+    timeouts.observe(make_result('h', 22, latency_ms=100))
+    assert timeouts.get('h') == pytest.approx(0.3)
+
+    # RTTVAR = 3/4 * 0.05 + 1/4 * |0.1 - 0.2|, SRTT = 7/8 * 0.1 + 1/8 * 0.2
+    timeouts.observe(make_result('h', 22, latency_ms=200))
+    assert timeouts.get('h') == pytest.approx(0.1125 + 4 * 0.0625)
+    assert timeouts.get('h', attempt=1) == pytest.approx(2 * (0.1125 + 4 * 0.0625))
+    assert timeouts.get('other') == INITIAL_RTO
+
+
+def test_probe_timeouts_ignore_failed_probes():
+    timeouts = ProbeTimeouts(5.0, adaptive=True)
+    timeouts.observe(make_result('h', 22, False, 'Connection timeout', latency_ms=None))
+    timeouts.observe(make_result('h', 22, False, 'Network is unreachable', latency_ms=3))
+    assert timeouts.get('h') == INITIAL_RTO
+
+
+def test_probe_timeouts_are_clamped():
+    timeouts = ProbeTimeouts(0.5, adaptive=True, min_timeout=0.2)
+    assert timeouts.get('h') == 0.5
+    timeouts.observe(make_result('h', 22, latency_ms=1))
+    assert timeouts.get('h') == 0.2
+
+
+def test_probe_timeouts_retry_once():
+    timeouts = ProbeTimeouts(5.0, adaptive=True)
+    timed_out = make_result('h', 22, False, 'Connection timeout', latency_ms=None)
+    assert timeouts.should_retry(timed_out, 0)
+    assert not timeouts.should_retry(timed_out, 1)
+    assert timeouts.should_retry(make_result('h', 53, None, UDP_NO_RESPONSE), 0)
+    assert not timeouts.should_retry(make_result('h', 22, False), 0)
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+def test_scan_throttle_unlimited():
+    throttle = ScanThrottle(100)
+    assert throttle.delay() == 0.0
+    assert throttle.concurrency == 100
+
+
+def test_scan_throttle_token_bucket(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(portcheck, 'time', clock)
+    throttle = ScanThrottle(100, rate=8)
+    assert [throttle.delay() for _ in range(8)] == [0.0] * 8   # one second of burst
+    assert throttle.delay() == 0.125
+    clock.now += 0.0625
+    assert throttle.delay() == 0.0625
+    clock.now += 0.0625
+    assert throttle.delay() == 0.0
+    assert throttle.delay() == 0.125
+
+
+def test_scan_throttle_aimd():
+    throttle = ScanThrottle(32, aimd=True)
+    assert throttle.concurrency == AIMD_INITIAL
+
+    # Slow start: one more per success, so the window doubles per window
+    for _ in range(AIMD_INITIAL):
+        throttle.observe(make_result('h', 1))
+    assert throttle.concurrency == 32   # capped at max_concurrency
+    for _ in range(16):
+        throttle.observe(make_result('h', 1))
+
+    timed_out = make_result('h', 1, False, 'Connection timeout', latency_ms=None)
+    throttle.observe(timed_out)
+    assert throttle.concurrency == 16
+    throttle.observe(timed_out)
+    assert throttle.concurrency == 16   # at most one decrease per window
+
+    # Congestion avoidance: about one more per window of successes
+    for _ in range(16):
+        throttle.observe(make_result('h', 1))
+    assert throttle.concurrency == 16
+    throttle.observe(make_result('h', 1))
+    assert throttle.concurrency == 17
+
+
+def test_is_congestion():
+    assert is_congestion(make_result('h', 1, False, 'Connection timeout', latency_ms=None))
+    assert is_congestion(make_result('h', 1, False, os.strerror(errno.ENOBUFS)))
+    assert not is_congestion(make_result('h', 1, False))
+    assert not is_congestion(make_result('h', 1, False, 'Network is unreachable'))
+
+
+def test_scan_checkpoint_resume(tmp_path):
+    path = str(tmp_path / 'scan.state')
+    first = [make_result('h', 22), make_result('h', 80, is_open=False)]
+    checkpoint = ScanCheckpoint(path)
+    for result in first:
+        checkpoint.record(result)
+    checkpoint.close()
+    with open(path, 'a') as f:
+        f.write('{"host": "h", "po')
+
+    resumed = ScanCheckpoint(path, resume=True)
+    assert list(resumed.previous_results()) == first
+    probes = [('h', 22, None), ('h', 80, None), ('h', 443, None)]
+    assert list(resumed.pending(probes, 'tcp')) == [('h', 443, None)]
+    resumed.close()
+
+
+def test_scan_checkpoint_without_resume_starts_over(tmp_path):
+    path = str(tmp_path / 'scan.state')
+    checkpoint = ScanCheckpoint(path)
+    checkpoint.record(make_result('h', 22))
+    checkpoint.close()
+
+    fresh = ScanCheckpoint(path)
+    assert not fresh.done
+    assert list(fresh.previous_results()) == []
+    fresh.close()
+
+
+def test_scan_checkpoint_all_addresses_keys_by_address(tmp_path):
+    path = str(tmp_path / 'scan.state')
+    checkpoint = ScanCheckpoint(path, all_addresses=True)
+    checkpoint.record(make_result('h', 22, address='192.0.2.1'))
+    checkpoint.close()
+
+    resumed = ScanCheckpoint(path, resume=True, all_addresses=True)
+    probes = [('h', 22, '192.0.2.1'), ('h', 22, '192.0.2.2')]
+    assert list(resumed.pending(probes, 'tcp')) == [('h', 22, '192.0.2.2')]
+    resumed.close()
+
+
+@pytest.fixture
+def loopback_udp_ports():
+    """An answering, a silent and a closed UDP port on 127.0.0.1."""
+    def answer(sock):
+        while True:
+            try:
+                _, peer = sock.recvfrom(4096)
+                sock.sendto(b'pong', peer)
+            except OSError:
+                return
+
+    answering = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    answering.bind(('127.0.0.1', 0))
+    threading.Thread(target=answer, args=(answering,), daemon=True).start()
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(('127.0.0.1', 0))
+    closed = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    yield answering.getsockname()[1], silent.getsockname()[1], closed_port
+    answering.close()
+    silent.close()
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_scan_udp_against_loopback(engine, loopback_udp_ports):
+    answering, silent, closed = loopback_udp_ports
+    results = scan(iter_probes(['127.0.0.1'], [answering, silent, closed]), timeout=0.5,
+                   protocol='udp', engine=engine)
+    states = {result['port']: (result['open'], result['error']) for result in results}
+    assert states == {answering: (True, None), silent: (None, UDP_NO_RESPONSE),
+                      closed: (False, None)}
+
+
+def test_watch_reports_only_state_changes(loopback_ports):
+    open_port, closed_port = loopback_ports
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    closing_port = listener.getsockname()[1]
+    changes = {}
+    histograms = {}
+
+    def on_change(result, previous, state):
+        changes.setdefault(result['port'], []).append((previous, state))
+        if result['port'] == closing_port:
+            listener.close()
+
+    watch(['127.0.0.1'], [open_port, closed_port, closing_port], 0.01, on_change,
+          histograms, resolver=ResolverCache(), rounds=3, timeout=2)
+    assert changes == {open_port: [(None, 'open')], closed_port: [(None, 'closed')],
+                       closing_port: [(None, 'open'), ('open', 'closed')]}
+    assert histograms[('127.0.0.1', None, open_port)].total == 3
+    assert histograms[('127.0.0.1', None, closing_port)].total == 1
+
+
+def test_scan_sharded_by_port(loopback_ports):
+    open_port, closed_port = loopback_ports
+    results = []
+    scan_sharded(['127.0.0.1'], [open_port, closed_port, open_port + 1], 2, results.append,
+                 timeout=2)
+    assert sorted((result['port'], result['open']) for result in results) == \
+        sorted([(open_port, True), (closed_port, False), (open_port + 1, False)])
+
+
+def test_scan_sharded_by_host(loopback_ports):
+    open_port, closed_port = loopback_ports
+    results = []
+    scan_sharded(['127.0.0.1,127.0.0.2', '127.0.0.3'], [closed_port], 2, results.append,
+                 timeout=2, engine='select')
+    assert sorted(result['host'] for result in results) == \
+        ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+    assert not any(result['open'] for result in results)
+
+
+def test_scan_sharded_skips_done_probes(loopback_ports):
+    open_port, closed_port = loopback_ports
+    results = []
+    done = {probe_key('127.0.0.1', closed_port, 'tcp')}
+    scan_sharded(['127.0.0.1'], [open_port, closed_port], 2, results.append, done=done,
+                 timeout=2)
+    assert [(result['port'], result['open']) for result in results] == [(open_port, True)]
+
+
+def test_result_store_round_trip():
+    store = ResultStore()
+    results = [make_result('db1', 5432),
+               make_result('10.0.0.2', 22, is_open=False, error='Connection timeout',
+                           latency_ms=None),
+               make_result('10.0.0.2', 80, is_open=None, error='unreachable')]
+    for result in results:
+        store.add(result)
+    assert len(store) == 3
+    assert list(store) == results
+
+
+def test_result_store_open_only():
+    store = ResultStore(open_only=True)
+    store.add(make_result('h', 1))
+    store.add(make_result('h', 2, is_open=False))
+    store.add(make_result('h', 3, is_open=False, error='Connection timeout'))
+    store.add(make_result('h', 4, is_open=False, error='Host unreachable'))
+    assert [result['port'] for result in store] == [1, 4]
+
+
+def test_result_store_iter_sorted():
+    store = ResultStore()
+    for host, port in [('10.0.0.10', 80), ('web', 22), ('10.0.0.9', 443), ('10.0.0.9', 22),
+                       ('10.0.0.10', 22)]:
+        store.add(make_result(host, port))
+    assert [(result['host'], result['port']) for result in store.iter_sorted()] == [
+        ('10.0.0.9', 22), ('10.0.0.9', 443), ('10.0.0.10', 22), ('10.0.0.10', 80),
+        ('web', 22)]
+
+
+@pytest.mark.parametrize('port_arg, expected', [
+    ('22', [22]),
+    ('80-83', [80, 81, 82, 83]),
+    ('22, 80-81,8080', [22, 80, 81, 8080]),
+    ('81,80-82', [81, 80, 82]),
+    ('top3', list(TOP_PORTS['tcp'][:3])),
+])
+def test_parse_port_argument(port_arg, expected):
+    assert parse_port_argument(port_arg) == expected
+
+
+def test_parse_port_argument_top_udp():
+    assert parse_port_argument('top2', 'udp') == list(TOP_PORTS['udp'][:2])
+
+
+@pytest.mark.parametrize('port_arg', ['', '0', '65536', '90-80', '1-2-3', 'http', 'top0',
+                                      'top100000'])
+def test_parse_port_argument_rejects(port_arg):
+    with pytest.raises(ValueError):
+        parse_port_argument(port_arg)
+
+
+def test_order_ports():
+    assert order_ports([1, 22, 2, 80, 443]) == [80, 443, 22, 1, 2]
+    assert order_ports([5, 4, 3]) == [5, 4, 3]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_scan_stops_early(engine, loopback_ports):
+    open_port, closed_port = loopback_ports
+    seen = []
+
+    def stop_at_first(result):
+        seen.append(result)
+        raise ScanStopped()
+
+    probes = iter_probes(['127.0.0.1'], [open_port] + [closed_port] * 500)
+    assert scan(probes, timeout=2, workers=4, engine=engine, on_result=stop_at_first) == []
+    assert len(seen) == 1
@@ -0,0 +1,401 @@
+import concurrent.futures
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+
+import pytest
+import timer
+from timer import (USAGE_FIELDS, BenchmarkResult, LatencyHistogram, RunningStats,
+                   _run_closed_loop, _run_open_loop, apply_overhead, bootstrap_ci,
+                   check_baseline, expand_param_values, mann_whitney_u, needs_shell,
+                   parse_cpu_list, run_command)
+
+
+@pytest.mark.parametrize('command, expected', [
+    ('ls -l /tmp', False),
+    ("grep -c 'a b' file", False),
+    ('ls | wc -l', True),
+    ('echo $HOME', True),
+    ('cd /tmp', True),
+    ('FOO=1 env', True),
+    ('echo "unterminated', True),
+])
+def test_needs_shell(command, expected):
+    assert needs_shell(command) is expected
+
+
+def test_run_command_success_reports_usage():
+    elapsed, success, message, usage = run_command(
+        f'{sys.executable} -c "sum(range(3000000))"')
+    assert success
+    assert message == ''
+    assert elapsed > 0
+    assert set(USAGE_FIELDS) - set(usage) <= {'max_rss_kb'}
+    assert usage['user_time'] > 0
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='Linux max RSS semantics')
+def test_run_command_max_rss_only_when_above_own():
+    _, _, _, usage = run_command('true')
+    assert 'max_rss_kb' not in usage
+
+    own_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size_kb = own_kb + 64 * 1024
+    _, success, _, usage = run_command(
+        f'{sys.executable} -c "b = bytes(1) * ({size_kb} * 1024)"')
+    assert success
+    assert usage['max_rss_kb'] >= size_kb
+
+
+def test_run_command_exit_status():
+    _, success, message, usage = run_command('false')
+    assert not success
+    assert message == 'Exit status 1'
+    assert usage is not None
+
+
+def test_run_command_keeps_stderr_tail():
+    _, success, message, _ = run_command("sh -c 'echo first >&2; echo last >&2; exit 3'",
+                                         tail_bytes=5)
+    assert not success
+    assert message == 'last'
+
+
+def test_run_command_signal():
+    _, success, message, _ = run_command('sh -c "kill -9 $$"')
+    assert not success
+    assert message == 'Killed by signal 9'
+
+
+def test_run_command_timeout_kills():
+    elapsed, success, message, _ = run_command('sleep 5', timeout=0.2)
+    assert not success
+    assert message == 'Command timed out after 0.2 seconds'
+    assert elapsed < 2
+
+
+def test_run_command_missing_executable():
+    _, success, message, usage = run_command('no-such-command-for-timer-tests')
+    assert not success
+    assert 'no-such-command-for-timer-tests' in message
+    assert usage is None
+
+
+def test_run_command_counts_output():
+    _, success, _, usage = run_command('printf hello', output='count')
+    assert success
+    assert usage['output_bytes'] == 5
+
+
+def test_closed_loop_bounds_concurrency():
+    lock = threading.Lock()
+    running = [0, 0]   # current, peak
+    recorded = []
+
+    def run():
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return (0.01, True, '', None)
+
+    _run_closed_loop(run, 20, 3, lambda *sample: recorded.append(sample))
+    assert len(recorded) == 20
+    assert 2 <= running[1] <= 3
+
+
+def test_open_loop_paces_arrivals():
+    starts, recorded, lags = [], [], []
+
+    def run():
+        starts.append(time.perf_counter())
+        return (0.001, True, '', None)
+
+    began = time.perf_counter()
+    _run_open_loop(run, 10, 100, 4, lambda *sample: recorded.append(sample), lags.append)
+    assert len(recorded) == len(lags) == 10
+    assert time.perf_counter() - began >= 9 / 100
+    assert max(starts) - min(starts) >= 0.08
+    assert all(lag >= 0 for lag in lags)
+    assert all(elapsed >= 0.001 for elapsed, *_ in recorded)
+
+
+def test_open_loop_counts_queueing_in_latency():
+    recorded, lags = [], []
+
+    def run():
+        time.sleep(0.02)
+        return (0.02, True, '', None)
+
+    # One worker, arrivals every 5 ms: later runs wait for the worker
+    _run_open_loop(run, 5, 200, 1, lambda *sample: recorded.append(sample), lags.append)
+    assert max(lags) > 0.03
+    assert max(elapsed for elapsed, *_ in recorded) == pytest.approx(max(lags) + 0.02)
+
+
+class InlineExecutor:
+    """Executor that runs each task as it is submitted."""
+
+    def __init__(self, max_workers):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_open_loop_records_while_behind_schedule(monkeypatch):
+    monkeypatch.setattr(timer, 'ThreadPoolExecutor', InlineExecutor)
+    started, recorded = [], []
+
+    def run():
+        assert len(recorded) == len(started)   # earlier runs already collected
+        started.append(None)
+        return (0.0, True, '', None)
+
+    # At 10**9 arrivals per second every arrival is already due
+    _run_open_loop(run, 1000, 1e9, 4, lambda *sample: recorded.append(sample), lambda lag: None)
+    assert len(recorded) == 1000
+
+
+def test_mann_whitney_u_averages_tied_ranks():
+    u, p = mann_whitney_u([1, 2, 3], [3, 4, 5])
+    assert u == 0.5
+    assert 0 < p < 1
+
+
+def test_mann_whitney_u_is_symmetric():
+    a, b = [1, 2, 3, 3], [3, 4, 5]
+    u_ab, p_ab = mann_whitney_u(a, b)
+    u_ba, p_ba = mann_whitney_u(b, a)
+    assert u_ab + u_ba == len(a) * len(b)
+    assert p_ab == pytest.approx(p_ba)
+
+
+def test_mann_whitney_u_all_ties_is_not_significant():
+    assert mann_whitney_u([2, 2, 2], [2, 2, 2]) == (4.5, 1.0)
+
+
+def test_mann_whitney_u_detects_shift():
+    _, p = mann_whitney_u(list(range(20)), list(range(100, 120)))
+    assert p < 0.001
+
+
+def test_bootstrap_ci_constant_sample():
+    assert bootstrap_ci([[3.0] * 10]) == (3.0, 3.0)
+
+
+def test_bootstrap_ci_brackets_median():
+    rng = random.Random(1)
+    sample = [rng.gauss(10, 1) for _ in range(201)]
+    low, high = bootstrap_ci([sample])
+    assert low < statistics.median(sample) < high
+    assert high - low < 1
+
+
+def test_bootstrap_ci_ratio_of_medians():
+    rng = random.Random(2)
+    baseline = [rng.uniform(1, 2) for _ in range(100)]
+    doubled = [value * 2 for value in baseline]
+    low, high = bootstrap_ci([baseline, doubled], lambda a, b: b / a)
+    assert low <= 2 <= high
+
+
+def test_bootstrap_ci_is_deterministic():
+    sample = [float(i) for i in range(50)]
+    assert bootstrap_ci([sample]) == bootstrap_ci([sample])
+
+
+def test_running_stats_merge_matches_statistics():
+    rng = random.Random(3)
+    values = [rng.expovariate(1) for _ in range(1000)]
+    left, right = RunningStats(), RunningStats()
+    for value in values[:300]:
+        left.add(value)
+    for value in values[300:]:
+        right.add(value)
+    left.merge(right)
+    assert left.count == len(values)
+    assert left.mean == pytest.approx(statistics.mean(values))
+    assert left.stdev == pytest.approx(statistics.stdev(values))
+    assert left.min == min(values)
+    assert left.max == max(values)
+    assert left.total == pytest.approx(sum(values))
+
+
+def test_running_stats_merge_empty():
+    stats = RunningStats()
+    stats.add(1.0)
+    stats.merge(RunningStats())
+    assert (stats.count, stats.mean) == (1, 1.0)
+
+    empty = RunningStats()
+    empty.merge(stats)
+    assert (empty.count, empty.mean, empty.min, empty.max) == (1, 1.0, 1.0, 1.0)
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('a,b', ['a', 'b']),
+    ('1..4', ['1', '2', '3', '4']),
+    ('0..10:5', ['0', '5', '10']),
+    ('1..8:x2', ['1', '2', '4', '8']),
+    ('0.5..1.5:0.5', ['0.5', '1', '1.5']),
+    ('fast, 1..2', ['fast', '1', '2']),
+])
+def test_expand_param_values(spec, expected):
+    assert expand_param_values(spec) == expected
+
+
+@pytest.mark.parametrize('spec', ['', ' , ', '5..1', '1..4:0', '1..8:x1', '0..8:x2'])
+def test_expand_param_values_rejects(spec):
+    with pytest.raises(ValueError):
+        expand_param_values(spec)
+
+
+def make_result(times, command='cmd'):
+    result = BenchmarkResult(command, len(times))
+    for elapsed in times:
+        result.add_time(elapsed)
+    return result
+
+
+def test_check_baseline_flags_significant_slowdown():
+    rng = random.Random(4)
+    baseline = [rng.uniform(0.10, 0.11) for _ in range(30)]
+    record = {'label': 'main', 'timestamp': '2026-01-01T00:00:00', 'times': baseline}
+    slower = make_result([elapsed * 1.3 for elapsed in baseline])
+
+    check = check_baseline(slower, record, 0.05, max_slowdown=10)
+    assert check['verdict'] == 'slower'
+    assert check['regression']
+    assert check['label'] == 'main'
+    assert check['ratio'] == pytest.approx(1.3)
+
+    assert not check_baseline(slower, record, 0.05, max_slowdown=50)['regression']
+    assert not check_baseline(slower, record, 0.05)['regression']
+
+
+def test_check_baseline_ignores_noise():
+    rng = random.Random(5)
+    baseline = [rng.uniform(0.10, 0.11) for _ in range(30)]
+    current = make_result([rng.uniform(0.10, 0.11) for _ in range(30)])
+    check = check_baseline(current, {'label': 'main', 'times': baseline}, 0.05,
+                           max_slowdown=0)
+    assert check['verdict'] == 'no significant difference'
+    assert not check['regression']
+
+
+def test_apply_overhead_records_without_subtracting():
+    result = make_result([0.050, 0.052, 0.051, 0.053, 0.050])
+    apply_overhead(result, [0.001, 0.002, 0.001], subtract=False)
+    assert result.overhead['median'] == 0.001
+    assert result.overhead['iterations'] == 3
+    assert not result.overhead['subtracted']
+    assert not result.overhead['indistinguishable']
+    assert result.times[0] == 0.050
+
+
+def test_apply_overhead_subtracts_median():
+    result = make_result([0.050, 0.052, 0.0005])
+    apply_overhead(result, [0.001, 0.002, 0.001], subtract=True)
+    assert result.times == pytest.approx([0.049, 0.051, 0.0])
+    assert result.get_statistics()['max'] == pytest.approx(0.051)
+    assert result.histogram.count == 3
+
+
+def test_apply_overhead_flags_indistinguishable_command():
+    overhead = [0.001, 0.0012, 0.0011, 0.0009, 0.001]
+    result = make_result([0.0011, 0.001, 0.0009, 0.0012, 0.001])
+    apply_overhead(result, overhead, subtract=False)
+    assert result.overhead['indistinguishable']
+
+
+def test_histogram_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for ns in range(256):
+        assert histogram.bucket_range(histogram._index(ns)) == (ns, ns)
+
+
+@pytest.mark.parametrize('ns', [255, 256, 1000, 123456789, 10 ** 12])
+def test_histogram_bucket_contains_value(ns):
+    histogram = LatencyHistogram()
+    low, high = histogram.bucket_range(histogram._index(ns))
+    assert low <= ns <= high
+    assert high - low < max(1, ns / 2 ** (histogram.sub_bucket_bits - 1))
+
+
+def test_histogram_percentile():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.050, rel=0.01)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.01)
+    assert LatencyHistogram().percentile(50) is None
+
+
+def test_histogram_merge():
+    a, b, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for i, seconds in enumerate([0.001, 0.002, 0.002, 0.5, 3.0]):
+        (a if i % 2 else b).record(seconds)
+        both.record(seconds)
+    a.merge(b)
+    assert a.counts == both.counts
+    assert a.count == both.count
+
+
+def test_histogram_merge_rejects_other_layout():
+    with pytest.raises(ValueError):
+        LatencyHistogram(8).merge(LatencyHistogram(7))
+
+
+def test_histogram_dict_round_trip():
+    histogram = LatencyHistogram()
+    histogram.record(0.0, 2)
+    for seconds in [0.000001, 0.0015, 0.0015, 0.25, 42.0]:
+        histogram.record(seconds)
+    restored = LatencyHistogram.from_dict(histogram.to_dict())
+    assert restored.counts == histogram.counts
+    assert restored.count == histogram.count
+    assert restored.sub_bucket_bits == histogram.sub_bucket_bits
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2', [2]),
+    ('0,2', [0, 2]),
+    ('4-7', [4, 5, 6, 7]),
+    ('3, 0-1,1', [0, 1, 3]),
+])
+def test_parse_cpu_list(value, expected):
+    assert parse_cpu_list(value) == expected
+
+
+@pytest.mark.parametrize('value', ['', ',', '3-1', '-1', 'a'])
+def test_parse_cpu_list_rejects(value):
+    with pytest.raises(ValueError):
+        parse_cpu_list(value)
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='per-thread nice is Linux-only')
+def test_spawner_renices_only_the_command(tmp_path):
+    niceness = tmp_path / 'nice.txt'
+    before = os.getpriority(os.PRIO_PROCESS, 0)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as spawner:
+        spawner.submit(os.setpriority, os.PRIO_PROCESS, 0, before + 3).result()
+        _, success, _, _ = run_command(f"sh -c 'nice > {niceness}'", spawner=spawner)
+    assert success
+    assert int(niceness.read_text()) == before + 3
+    assert os.getpriority(os.PRIO_PROCESS, 0) == before